@@ -1,57 +1,71 @@
-from flask import Flask, render_template, request, jsonify
-from nlp import preprocess_text, classify_text, generate_reply
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from nlp import MODEL_PATH, preprocess_text, classify_text, generate_reply, generate_reply_stream, warm_up
 from utils import read_file_text
 from dotenv import load_dotenv
-import json
+from werkzeug.exceptions import HTTPException
 import os
-import joblib
+import re
 import logging
 import gc
 import sys
+import threading
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (LOG_LEVEL=DEBUG mostra a analise detalhada de cada score)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-# Garantir que o modelo existe ao iniciar
+# Evitar coletas completas (geracao 2) durante o atendimento das requisicoes
+gc.set_threshold(50000, 10, 10)
+
+# Garantir que o modelo existe ao iniciar (o treino e feito por: python -m train_model)
 def initialize_model():
-    try:
-        if not os.path.exists("models/tfidf_lr.joblib"):
-            logger.info("[TRAIN] Modelo nao encontrado. Treinando...")
-            from train_model import pipeline, TEXTS, LABELS
-            os.makedirs("models", exist_ok=True)
-            pipeline.fit(TEXTS, LABELS)
-            joblib.dump(pipeline, "models/tfidf_lr.joblib")
-            logger.info("[OK] Modelo treinado e salvo com sucesso!")
-        else:
-            logger.info("[OK] Modelo carregado do arquivo existente")
-    except Exception as e:
-        logger.error(f"[ERRO] Erro ao inicializar modelo: {e}")
+    if not os.path.exists(MODEL_PATH):
+        logger.critical(f"[ERRO FATAL] Modelo nao encontrado em {MODEL_PATH}. Execute: python -m train_model")
+        sys.exit(1)
+    logger.info(f"[OK] Modelo encontrado em {MODEL_PATH}")
 
 initialize_model()
 load_dotenv()
 
+# Objetos de inicializacao (modulos e bibliotecas importados) vivem ate o fim do
+# processo: tira-los das varreduras do GC de uma vez por todas
+gc.freeze()
+
+def _warm_up_and_freeze():
+    warm_up()
+    # Modelo e recursos do NLTK tambem vivem ate o fim do processo
+    gc.freeze()
+
 app = Flask(__name__)
 
-def limpar_cache():
-    """Limpa cache e memoria para nao contaminar proximas requisicoes"""
-    try:
-        gc.collect()
-        logger.info("[CACHE] Limpeza de cache realizada")
-    except Exception as e:
-        logger.error(f"[AVISO] Erro ao limpar cache: {e}")
+# Uploads maiores que 1 MiB sao rejeitados pelo Werkzeug antes de qualquer processamento
+app.config["MAX_CONTENT_LENGTH"] = 1 * 1024 * 1024
+# Bytes lidos de arquivos .txt (o restante nao e usado na classificacao)
+MAX_FILE_BYTES = 64 * 1024
+
+# Quebras de linha -> HTML em uma unica passada ("\r\n" conta como "\n")
+_NL_RE = re.compile(r"(\r?\n\r?\n)|\r?\n")
 
-@app.before_request
-def before_request():
-    """Limpa cache antes de cada requisicao"""
-    if request.method == "POST":
-        logger.info("[REQ] Limpando cache antigo...")
-        limpar_cache()
+def format_reply_html(reply_text):
+    """Converte paragrafos em <p> e quebras simples em <br>."""
+    return _NL_RE.sub(lambda m: "<p>" if m.group(1) else "<br>", reply_text)
 
 @app.route("/", methods=["GET"])
 def index():
     return render_template("index.html")
 
+@app.errorhandler(413)
+def file_too_large(e):
+    logger.warning("[AVISO] Upload rejeitado: excede MAX_CONTENT_LENGTH")
+    if request.path == "/process/stream":
+        # A rota de streaming responde sempre em texto puro, inclusive nos erros
+        return Response("Arquivo muito grande. O limite e de 1 MB.", status=413, mimetype="text/plain")
+    return render_template("index.html", result={
+        "category": "Erro",
+        "score": 0,
+        "reply": "Arquivo muito grande. O limite e de 1 MB."
+    }), 413
+
 @app.route("/process", methods=["POST"])
 def process():
     try:
@@ -61,7 +75,7 @@ def process():
         # Ler texto do arquivo se fornecido
         if uploaded and uploaded.filename != "":
             try:
-                text = read_file_text(uploaded)
+                text = read_file_text(uploaded, max_bytes=MAX_FILE_BYTES)
                 logger.info(f"📄 Arquivo lido: {uploaded.filename}")
             except Exception as e:
                 logger.error(f"[ERRO] Erro ao ler arquivo: {e}")
@@ -93,7 +107,7 @@ def process():
         user_assunto = request.form.get("assunto", "").strip()
 
         # Gerar resposta
-        reply_json = generate_reply(
+        structured_reply = generate_reply(
             email_text=text,
             category=category,
             user_name=user_nome,
@@ -102,15 +116,12 @@ def process():
             classification_score=score  # PASSAR O SCORE REAL DA CLASSIFICACAO!
         )
 
-        # Processar resposta JSON
-        structured_reply = json.loads(reply_json)
-        
         reply_text = structured_reply.get("reply", "Não foi possível gerar resposta.")
         reply_category = structured_reply.get("category", category)
         reply_score = structured_reply.get("score", score)
         
         # Formatar resposta para HTML
-        reply_html = reply_text.replace("\r\n", "\n").replace("\n\n", "<p>").replace("\n", "<br>")
+        reply_html = format_reply_html(reply_text)
         
         result = {
             "category": reply_category,
@@ -119,26 +130,62 @@ def process():
         }
         
         logger.info(f"[OK] Resposta gerada com sucesso")
-        limpar_cache()  # Limpar cache apos processar
         return render_template("index.html", result=result)
         
-    except json.JSONDecodeError as e:
-        logger.error(f"[ERRO] Erro ao decodificar JSON: {e}")
-        limpar_cache()  # Limpar cache mesmo em erro
-        return render_template("index.html", result={
-            "category": "Erro",
-            "score": 0,
-            "reply": f"Erro ao processar resposta: {str(e)}"
-        })
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[ERRO CRITICO] {str(e)}", exc_info=True)
-        limpar_cache()  # Limpar cache mesmo em erro
         return render_template("index.html", result={
             "category": "Erro",
             "score": 0,
             "reply": f"Erro ao processar: {str(e)}"
         }), 500
 
+@app.route("/process/stream", methods=["POST"])
+def process_stream():
+    """Mesma analise de /process, com a resposta em texto puro enviada enquanto e gerada."""
+    text = request.form.get("text", "").strip()
+    uploaded = request.files.get("file")
+
+    if uploaded and uploaded.filename != "":
+        try:
+            text = read_file_text(uploaded, max_bytes=MAX_FILE_BYTES)
+            logger.info(f"📄 Arquivo lido: {uploaded.filename}")
+        except Exception as e:
+            logger.error(f"[ERRO] Erro ao ler arquivo: {e}")
+            return Response(f"Erro ao ler arquivo: {str(e)}", status=400, mimetype="text/plain")
+
+    if not text:
+        return Response("Forneça um texto ou arquivo.", status=400, mimetype="text/plain")
+
+    try:
+        processed = preprocess_text(text)
+        category, score = classify_text(processed["clean_text"])
+        logger.info(f"[INFO] Classificacao: {category} (confianca: {score:.2f})")
+    except Exception as e:
+        logger.error(f"[ERRO CRITICO] {str(e)}", exc_info=True)
+        return Response(f"Erro ao processar: {str(e)}", status=500, mimetype="text/plain")
+
+    reply_chunks = generate_reply_stream(
+        email_text=text,
+        category=category,
+        user_name=request.form.get("nome", "").strip(),
+        user_email=request.form.get("email", "").strip(),
+        user_subject=request.form.get("assunto", "").strip(),
+        classification_score=score
+    )
+    # Categoria e score bruto vao nos cabecalhos: o corpo ja comeca com a resposta
+    return Response(stream_with_context(reply_chunks), mimetype="text/plain", headers={
+        "X-Category": category,
+        "X-Classification-Score": f"{score:.2f}"
+    })
+
 if __name__ == "__main__":
+    # Modelo e NLTK carregam em segundo plano enquanto o servidor sobe (uma
+    # requisicao que chegue antes apenas espera o carregamento terminar). So
+    # aqui, e nao no import: um fork com a thread segurando os locks do nlp
+    # deixaria o processo filho travado para sempre
+    threading.Thread(target=_warm_up_and_freeze, name="warm-up", daemon=True).start()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
@@ -1,41 +1,114 @@
 import re
 import os
 import json
-import joblib
+import bisect
+import functools
+import hashlib
 import logging
-from typing import Tuple, Dict
-from nltk.stem import RSLPStemmer
-from sklearn.feature_extraction.text import TfidfVectorizer
+import time
+import queue
+import threading
+import asyncio
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from types import MappingProxyType
+from typing import Tuple, Dict, Iterator, List, Mapping
+import numpy as np
+from utils import LRUCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
-# Stopwords
-try:
-    from nltk.corpus import stopwords
-    _stop_words = set(stopwords.words("portuguese"))
-except Exception:
-    _stop_words = set([
-        "de","da","do","em","um","uma","para","com","é","e","o","a","os","as",
-        "no","na","por","se","que","ao","à","este","esse","aquele"
-    ])
-
-# Stemmer
-try:
-    stemmer = RSLPStemmer()
-except Exception:
-    class _DummyStemmer:
-        def stem(self, word):
-            return word
-    stemmer = _DummyStemmer()
+# Caches de pré-processamento, predição e resposta (chave = digest blake2b das entradas)
+CACHE_TTL = 600
+_PREPROCESS_CACHE = LRUCache(maxsize=1024)
+_CLASSIFY_CACHE = LRUCache(maxsize=4096)
+_REPLY_CACHE = LRUCache(maxsize=1024, ttl=CACHE_TTL)
+
+def _cache_key(*parts) -> str:
+    """Gera a chave de cache a partir das entradas, sem reter o texto completo."""
+    data = "\x00".join(str(part) for part in parts).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Stopwords (NLTK) e stemmer: importar o NLTK custa mais de um
+# segundo, então são carregados no primeiro pré-processamento por _ensure_nltk()
+_FALLBACK_STOP_WORDS = frozenset([
+    "de","da","do","em","um","uma","para","com","é","e","o","a","os","as",
+    "no","na","por","se","que","ao","à","este","esse","aquele"
+])
+_stop_words = frozenset()
+_stop_words_stemmed = frozenset()
+_stem = None
+_stem_words = None
+_nltk_ready = False
+_nltk_lock = threading.Lock()
+
+class _DummyStemmer:
+    def stem(self, word):
+        return word
+
+def _ensure_nltk():
+    """Carrega stopwords (NLTK) e stemmer (PyStemmer ou RSLP) uma única vez por processo."""
+    global _stop_words, _stop_words_stemmed, _stem, _stem_words, _PROFESSIONAL_KEYWORDS_STEMMED, _nltk_ready
+    if _nltk_ready:
+        return
+    with _nltk_lock:
+        if _nltk_ready:
+            return
+        try:
+            from nltk.corpus import stopwords
+            stop_words = frozenset(stopwords.words("portuguese"))
+        except Exception:
+            stop_words = _FALLBACK_STOP_WORDS
+
+        try:
+            # Snowball em C (PyStemmer): stemWords processa a lista inteira em uma chamada
+            import Stemmer
+            snowball = Stemmer.Stemmer("portuguese")
+            stem = snowball.stemWord
+            stem_words = snowball.stemWords
+        except ImportError:
+            try:
+                from nltk.stem import RSLPStemmer
+                stemmer = RSLPStemmer()
+            except Exception:
+                stemmer = _DummyStemmer()
+            # Memoização dos stems (vocabulário de emails é muito repetitivo; LRU limita a memória)
+            stem = functools.lru_cache(maxsize=65536)(stemmer.stem)
+
+            def stem_words(words):
+                return list(map(stem, words))
+
+        _stop_words = stop_words
+        # Formas flexionadas de stopwords que só aparecem após o stemming
+        _stop_words_stemmed = frozenset(stem(w) for w in stop_words)
+        # clean_text chega stemizado: compara-se com os stems das palavras-chave
+        _PROFESSIONAL_KEYWORDS_STEMMED = frozenset(stem(w) for w in _PROFESSIONAL_KEYWORDS)
+        _stem = stem
+        _stem_words = stem_words
+        _nltk_ready = True
 
 MODEL_PATH = "models/tfidf_lr.joblib"
 pipeline = None
+_pipeline_loaded = False
+# Rótulo de cada posição de pipeline.classes_ (calculado ao carregar o modelo)
+_class_labels = ()
+# Pesos do classificador em int8 (calculados ao carregar o modelo)
+_quantized = None
+_pipeline_lock = threading.Lock()
 
 def load_model():
-    global pipeline
+    """Lê o pipeline treinado do disco (use get_pipeline() para a instância em cache)."""
     if os.path.exists(MODEL_PATH):
         try:
-            pipeline = joblib.load(MODEL_PATH)
+            import joblib
+            # Arrays (coef_ 1x2^18, idf_) mapeados do disco em modo leitura: workers
+            # do mesmo servidor compartilham as páginas em vez de copiar o modelo
+            pipeline = joblib.load(MODEL_PATH, mmap_mode="r")
             logger.info(f"[OK] Modelo carregado de: {MODEL_PATH}")
             return pipeline
         except Exception as e:
@@ -46,20 +119,162 @@ def load_model():
         logger.info("[INFO] Execute: python train_model.py")
         return None
 
-pipeline = load_model()
+# Pesos int8 de uma regressão logística binária: score = (X · coef_q) * scale + intercept
+QuantizedClassifier = namedtuple("QuantizedClassifier", ["features", "coef_q", "scale", "intercept"])
 
-def preprocess_text(text: str) -> Dict:
-    """Pré-processa o texto removendo stopwords e aplicando stemming."""
-    if not text:
-        return {"original_text": "", "clean_text": "", "token_count": 0, "word_count": 0}
+def _quantize_classifier(pipeline):
+    """Quantiza coef_ para int8 com uma escala simétrica (None se não for binário)."""
+    classifier = pipeline[-1]
+    coef = np.asarray(classifier.coef_, dtype=np.float64)
+    if coef.shape[0] != 1:
+        return None
+    max_abs = float(np.abs(coef).max())
+    scale = max_abs / 127 if max_abs > 0 else 1.0
+    coef_q = np.round(coef[0] / scale).astype(np.int8)
+    return QuantizedClassifier(pipeline[:-1], coef_q, scale, float(classifier.intercept_[0]))
+
+def get_pipeline():
+    """Retorna o pipeline em memória, carregando-o do disco uma única vez por processo."""
+    global pipeline, _pipeline_loaded, _class_labels, _quantized
+    if not _pipeline_loaded:
+        with _pipeline_lock:
+            if not _pipeline_loaded:
+                pipeline = load_model()
+                if pipeline is not None:
+                    _class_labels = tuple(
+                        "Produtivo" if c == 1 else "Improdutivo" for c in pipeline.classes_
+                    )
+                    try:
+                        _quantized = _quantize_classifier(pipeline)
+                    except Exception as e:
+                        logger.error(f"[ERRO] Erro ao quantizar modelo: {e}")
+                _pipeline_loaded = True
+    return pipeline
+
+def warm_up():
+    """Carrega stopwords, stemmer e modelo e faz uma predição, para a primeira requisição não pagar isso.
+    
+    Seguro em paralelo com requisições: quem chegar antes espera nos mesmos locks.
+    """
+    started = time.monotonic()
+    try:
+        classify_text(preprocess_text("aquecimento do modelo de classificacao de emails")["clean_text"])
+        logger.info(f"[OK] Modelo e recursos NLP aquecidos em {time.monotonic() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"[ERRO] Falha no aquecimento do modelo: {e}")
+
+class _Batcher:
+    """Agrupa chamadas concorrentes em um único lote para a função de predição.
+
+    Uma thread de fundo recolhe tudo o que já está na fila (até max_batch_size)
+    e faz uma só chamada a predict_fn. Um item sozinho é processado na hora;
+    só quando há mais de um esperando (carga concorrente) a thread aguarda até
+    max_latency_ms por outros itens para completar o lote.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_latency_ms=5):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item) -> Future:
+        """Enfileira item e retorna um Future com o resultado correspondente."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="classify-batcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            # Recolhe sem esperar o que já chegou
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Fila vazia com um só item: nada indica que outros estão a caminho
+            while 1 < len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            items = [item for item, _ in batch]
+            try:
+                results = self.predict_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+def _predict_proba(texts):
+    """predict_proba do pipeline, usando os pesos int8 quando disponíveis."""
+    pipeline = get_pipeline()
+    if _quantized is None:
+        return pipeline.predict_proba(texts)
+    features, coef_q, scale, intercept = _quantized
+    X = features.transform(texts).tocsr()
+    # Produto esparso só nos termos presentes: peso de cada valor não nulo, somado por linha
+    rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    scores = np.bincount(rows, weights=X.data * coef_q[X.indices], minlength=X.shape[0])
+    positive = 1.0 / (1.0 + np.exp(-(scores * scale + intercept)))
+    return np.column_stack((1.0 - positive, positive))
+
+_classify_batcher = _Batcher(_predict_proba)
+# Espera máxima pelo resultado do lote (depois disso, heurística)
+CLASSIFY_TIMEOUT = 5.0
+
+# Tokens = sequências de letras/dígitos (pontuação é descartada na mesma varredura)
+_TOK_RE = re.compile(r"[^\W_]+")
+# URLs: o lookbehind só tenta casar "http" no início de uma palavra, sem
+# retentativas em cada posição de sequências longas de letras
+_URL_RE = re.compile(r"(?<![\w.-])https?://\S+")
+
+_EMPTY_PREPROCESS = MappingProxyType({"original_text": "", "clean_text": "", "token_count": 0, "word_count": 0})
+
+def preprocess_text(text: str) -> Mapping:
+    """Pré-processa o texto removendo stopwords e aplicando stemming (com cache por texto).
     
-    text = text.lower().strip()
-    words = text.split()
+    O resultado é somente leitura (o mesmo objeto fica no cache); use dict(resultado)
+    para obter uma cópia alterável.
+    """
+    if not text:
+        return _EMPTY_PREPROCESS
+    
+    key = _cache_key(text)
+    cached = _PREPROCESS_CACHE.get(key)
+    if cached is not None:
+        return cached
+    result = MappingProxyType(_preprocess_uncached(text))
+    _PREPROCESS_CACHE.set(key, result)
+    return result
+
+def _preprocess_uncached(text: str) -> Dict:
+    _ensure_nltk()
+    text = text.lower()
+    # URLs não viram tokens ("http", "www", "com"...)
+    words = _TOK_RE.findall(_URL_RE.sub(" ", text))
     
-    filtered_words = [
-        stemmer.stem(word) for word in words 
-        if word not in _stop_words and len(word) > 2
-    ]
+    # Filtros em compreensões e stemming da lista inteira em uma chamada
+    stop_words, stop_words_stemmed = _stop_words, _stop_words_stemmed
+    candidates = [word for word in words if len(word) > 2 and word not in stop_words]
+    filtered_words = [stem for stem in _stem_words(candidates) if stem not in stop_words_stemmed]
     
     clean_text = " ".join(filtered_words)
     return {
@@ -69,10 +284,92 @@ def preprocess_text(text: str) -> Dict:
         "word_count": len(words)
     }
 
+# Palavras-chave profissionais, compartilhadas pela heurística de classificação
+# e pela análise de assunto e conteúdo de _analyze_email()
+_PROFESSIONAL_KEYWORDS = frozenset({
+    "urgente", "suporte", "erro", "bug", "problema", "solicitação",
+    "informação", "status", "dúvida", "questão", "reunião", "aprovação",
+    "acesso", "integração", "implementação", "feedback", "relatório",
+    "correção", "alteração", "backup", "dados", "projeto", "prazo"
+})
+# Preenchido por _ensure_nltk() com os stems de _PROFESSIONAL_KEYWORDS
+_PROFESSIONAL_KEYWORDS_STEMMED = frozenset()
+# Corpo do email: também conta pedidos genéricos de ajuda/atenção
+_CONTENT_KEYWORDS = _PROFESSIONAL_KEYWORDS | frozenset({
+    "ajuda", "assistência", "necessário", "importante", "atenção"
+})
+# Assunto: subconjunto mais restrito, mais "contato"
+_SUBJECT_KEYWORDS = frozenset({
+    "urgente", "suporte", "erro", "problema", "solicitação",
+    "informação", "status", "dúvida", "reunião", "aprovação",
+    "projeto", "prazo", "contato", "feedback", "relatório"
+})
+
+# Teto de confiança do modelo por faixa de palavras (<50, <100, <200, >=200)
+_MAX_CONFIDENCE_LIMITS = (50, 100, 200)
+_MAX_CONFIDENCE = (0.60, 0.70, 0.85, 1.0)
+
+# Heurística por faixa de palavras (<30, <50, <100, <200, >=200):
+# (mínimo de palavras-chave, (score, categoria) sem contexto, (score, categoria) com contexto)
+_HEURISTIC_LIMITS = (30, 50, 100, 200)
+_HEURISTIC_TABLE = (
+    (1, (0.2, "Improdutivo"), (0.2, "Improdutivo")),
+    (2, (0.3, "Improdutivo"), (0.5, "Produtivo")),
+    (1, (0.4, "Improdutivo"), (0.6, "Produtivo")),
+    (1, (0.6, "Improdutivo"), (0.75, "Produtivo")),
+    (1, (0.7, "Produtivo"), (0.9, "Produtivo")),
+)
+
 def classify_text(clean_text: str) -> Tuple[str, float]:
-    """Classifica o texto usando modelo treinado ou heurística."""
+    """Classifica o texto usando modelo treinado ou heurística (com cache por texto)."""
+    key = _cache_key(clean_text)
+    cached = _CLASSIFY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    category, score, cacheable = _classify_uncached(clean_text)
+    result = (category, score)
+    if cacheable:
+        _CLASSIFY_CACHE.set(key, result)
+    return result
+
+async def classify_text_async(clean_text: str) -> Tuple[str, float]:
+    """Versão assíncrona de classify_text(): a predição roda em uma thread auxiliar."""
+    return await asyncio.to_thread(classify_text, clean_text)
+
+def classify_many(clean_texts: List[str]) -> List[Tuple[str, float]]:
+    """Classifica vários textos; os que não estão em cache vão ao modelo em uma única chamada."""
+    keys = [_cache_key(text) for text in clean_texts]
+    results = [_CLASSIFY_CACHE.get(key) for key in keys]
+    # Textos com menos de 3 palavras não passam pelo modelo (ver _classify_uncached)
+    pending = [i for i, result in enumerate(results)
+               if result is None and len(clean_texts[i].split()) >= 3]
+    
+    probabilities = {}
+    if pending and get_pipeline() is not None:
+        try:
+            batch = _predict_proba([clean_texts[i] for i in pending])
+            probabilities = dict(zip(pending, batch))
+        except Exception as e:
+            logger.error(f"[ERRO] Erro ao usar modelo em lote: {e}")
+    
+    for i, result in enumerate(results):
+        if result is None:
+            category, score, cacheable = _classify_uncached(clean_texts[i], probabilities.get(i))
+            results[i] = (category, score)
+            if cacheable:
+                _CLASSIFY_CACHE.set(keys[i], results[i])
+    return results
+
+def _classify_uncached(clean_text: str, probabilities=None) -> Tuple[str, float, bool]:
+    """Classifica o texto usando modelo treinado ou heurística.
+    
+    probabilities: saída de predict_proba já calculada para o texto (usada por classify_many).
+    Retorna (categoria, score, cacheable): a heurística de fallback (modelo ausente,
+    com erro ou sem resposta no tempo limite) não vai para o cache, para que a
+    próxima chamada tente o modelo de novo.
+    """
     if not clean_text or len(clean_text.strip()) == 0:
-        return "Improdutivo", 0.0
+        return "Improdutivo", 0.0, True
     
     words = clean_text.split()
     word_count = len(words)
@@ -80,245 +377,332 @@ def classify_text(clean_text: str) -> Tuple[str, float]:
     # TEXTO MUITO CURTO = SEMPRE IMPRODUTIVO
     if word_count < 3:
         logger.warning(f"[AVISO] Texto muito curto ({word_count} palavras) - classificado como Improdutivo")
-        return "Improdutivo", 0.1
+        return "Improdutivo", 0.1, True
     
     # Limite de confiança baseado no tamanho
-    if word_count < 50:
-        max_confidence = 0.60
-    elif word_count < 100:
-        max_confidence = 0.70
-    elif word_count < 200:
-        max_confidence = 0.85
-    else:
-        max_confidence = 1.0
+    max_confidence = _MAX_CONFIDENCE[bisect.bisect_right(_MAX_CONFIDENCE_LIMITS, word_count)]
     
     # Se modelo disponível
+    pipeline = get_pipeline()
     if pipeline is not None:
         try:
-            prediction = pipeline.predict([clean_text])[0]
-            probabilities = pipeline.predict_proba([clean_text])[0]
-            category = "Produtivo" if prediction == 1 else "Improdutivo"
-            confidence = min(float(max(probabilities)), max_confidence)
+            if probabilities is None:
+                probabilities = _classify_batcher.submit(clean_text).result(timeout=CLASSIFY_TIMEOUT)
+            idx = int(probabilities.argmax())
+            category = _class_labels[idx]
+            confidence = min(float(probabilities[idx]), max_confidence)
             logger.info(f"[MODELO] {word_count} palavras -> {category} ({confidence:.2f})")
-            return category, confidence
+            return category, confidence, True
         except Exception as e:
             logger.error(f"[ERRO] Erro ao usar modelo: {e}")
     
     # Heurística se não houver modelo
-    productive_keywords = {
-        "urgente", "suporte", "erro", "bug", "problema", "solicitação",
-        "informação", "status", "dúvida", "questão", "reunião", "aprovação",
-        "acesso", "integração", "implementação", "feedback", "relatório",
-        "correção", "alteração", "backup", "dados", "projeto", "prazo"
-    }
-    
-    productive_count = sum(1 for word in words if word in productive_keywords)
-    score = 0.0
-    category = "Improdutivo"
-    
-    if word_count < 30:
-        score = 0.2
-        category = "Improdutivo"
-    elif 30 <= word_count < 50:
-        if productive_count >= 2:
-            score = 0.5
-            category = "Produtivo"
-        else:
-            score = 0.3
-            category = "Improdutivo"
-    elif 50 <= word_count < 100:
-        score = 0.4 if productive_count == 0 else 0.6
-        category = "Improdutivo" if productive_count == 0 else "Produtivo"
-    elif 100 <= word_count < 200:
-        score = 0.6 if productive_count == 0 else 0.75
-        category = "Improdutivo" if productive_count == 0 else "Produtivo"
-    else:
-        score = 0.7 if productive_count == 0 else 0.9
-        category = "Produtivo"
+    _ensure_nltk()
+    productive_count = len(_PROFESSIONAL_KEYWORDS_STEMMED.intersection(words))
+    min_keywords, without_context, with_context = _HEURISTIC_TABLE[
+        bisect.bisect_right(_HEURISTIC_LIMITS, word_count)
+    ]
+    score, category = with_context if productive_count >= min_keywords else without_context
     
     logger.info(f"[HEURISTICA] {word_count} palavras -> {category} ({score:.2f})")
-    return category, score
+    return category, score, False
+
+# Regex das palavras-chave do corpo. O lookahead não consome caracteres:
+# palavras que se sobrepõem ("problemacesso" -> "problema" e "acesso") são
+# encontradas como no teste de substring "palavra in texto"
+_KEYWORDS_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_CONTENT_KEYWORDS, key=len, reverse=True))) + "))"
+)
 
-def calculate_subject_confidence_boost(user_subject: str, user_name: str = "", user_email: str = "") -> float:
+# Remoção de acentos em C (str.translate): "Solicitacao" e "SOLICITAÇÃO" casam com "solicitação"
+_ACCENT_FOLD = str.maketrans(
+    "áàâãäéèêëíìîïóòôõöúùûüçÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇ",
+    "aaaaaeeeeiiiiooooouuuucAAAAAEEEEIIIIOOOOOUUUUC"
+)
+# Assunto: basta uma ocorrência (também como parte de palavra, ex.: "problemas")
+_SUBJECT_KEYWORDS_RE = re.compile(
+    "|".join(re.escape(w.translate(_ACCENT_FOLD)) for w in sorted(_SUBJECT_KEYWORDS)),
+    re.IGNORECASE
+)
+
+# Multiplicadores de assunto/remetente e de conteúdo de um email
+EmailAnalysis = namedtuple("EmailAnalysis", ["subject_boost", "content_boost"])
+
+def _analyze_email(user_subject: str, user_name: str, user_email: str,
+                   email_text: str, word_count: int) -> EmailAnalysis:
     """
-    Calcula um multiplicador de confiança baseado no ASSUNTO e dados do usuário.
+    Calcula em uma só chamada os multiplicadores de confiança do ASSUNTO/dados
+    do usuário e do CONTEÚDO do email (cada um entre 0.5 e 1.5).
+
+    Os motivos de cada ajuste são guardados como (formato, argumentos) e só
+    viram texto, em um único logger.debug, quando o nível DEBUG está ativo.
     """
-    boost = 1.0
-    
-    print("\n" + "="*80)
-    print("[ANALISE DE ASSUNTO E DADOS]")
-    print("="*80)
-    print(f"Assunto: '{user_subject}'")
-    print(f"Nome: '{user_name}'")
-    print(f"Email: '{user_email}'")
-    
+    notes = []
+
+    # --- Assunto e dados do usuário ---
+    subject_boost = 1.0
+
     # Verificar qualidade do assunto
     if not user_subject or user_subject.strip() == "":
-        print("  [RESULTADO] Sem assunto detectado - REDUZINDO 0.05")
-        boost -= 0.05
+        notes.append(("Sem assunto detectado - REDUZINDO 0.05",))
+        subject_boost -= 0.05
     elif len(user_subject) < 5:
-        print(f"  [RESULTADO] Assunto muito curto ({len(user_subject)} chars) - REDUZINDO 0.10")
-        boost -= 0.1
+        notes.append(("Assunto muito curto (%d chars) - REDUZINDO 0.10", len(user_subject)))
+        subject_boost -= 0.1
     elif len(user_subject) > 100:
-        print(f"  [RESULTADO] Assunto muito longo ({len(user_subject)} chars) - REDUZINDO 0.05")
-        boost -= 0.05
+        notes.append(("Assunto muito longo (%d chars) - REDUZINDO 0.05", len(user_subject)))
+        subject_boost -= 0.05
     else:
         # Assunto profissional/legítimo
-        professional_words = {
-            "urgente", "suporte", "erro", "problema", "solicitação",
-            "informação", "status", "dúvida", "reunião", "aprovação",
-            "projeto", "prazo", "contato", "feedback", "relatório"
-        }
-        subject_lower = user_subject.lower()
-        if any(word in subject_lower for word in professional_words):
-            print(f"  [RESULTADO] Assunto PROFISSIONAL detectado - AUMENTANDO 0.15")
-            boost += 0.15
+        if _SUBJECT_KEYWORDS_RE.search(user_subject.translate(_ACCENT_FOLD)):
+            notes.append(("Assunto PROFISSIONAL detectado - AUMENTANDO 0.15",))
+            subject_boost += 0.15
         else:
-            print(f"  [RESULTADO] Assunto genérico/normal")
-    
+            notes.append(("Assunto genérico/normal",))
+
     # Verificar qualidade do nome
     if user_name and len(user_name) > 3:
-        print(f"  [RESULTADO] Nome completo '{user_name}' - AUMENTANDO 0.10")
-        boost += 0.1
+        notes.append(("Nome completo '%s' - AUMENTANDO 0.10", user_name))
+        subject_boost += 0.1
     else:
-        print(f"  [RESULTADO] Nome ausente ou muito curto")
-    
+        notes.append(("Nome ausente ou muito curto",))
+
     # Verificar email
     if user_email:
         if "@" in user_email and "." in user_email:
             if "gmail.com" in user_email or "hotmail.com" in user_email or "yahoo.com" in user_email:
-                print(f"  [RESULTADO] Email pessoal (gmail/hotmail/yahoo) - AUMENTANDO 0.05")
-                boost += 0.05
+                notes.append(("Email pessoal (gmail/hotmail/yahoo) - AUMENTANDO 0.05",))
+                subject_boost += 0.05
             elif any(domain in user_email for domain in ["empresa", "company", "corp", "inc"]):
-                print(f"  [RESULTADO] Email CORPORATIVO - AUMENTANDO 0.20")
-                boost += 0.2
+                notes.append(("Email CORPORATIVO - AUMENTANDO 0.20",))
+                subject_boost += 0.2
             else:
-                print(f"  [RESULTADO] Email padrão")
+                notes.append(("Email padrão",))
         else:
-            print(f"  [RESULTADO] Email SUSPEITO - REDUZINDO 0.15")
-            boost -= 0.15
+            notes.append(("Email SUSPEITO - REDUZINDO 0.15",))
+            subject_boost -= 0.15
     else:
-        print(f"  [RESULTADO] Email não fornecido")
-    
-    boost = max(0.5, min(boost, 1.5))
-    
-    print(f"\n[MULTIPLICADOR ASSUNTO/EMAIL/NOME] = {boost:.2f} (0.5-1.5)")
-    print("="*80 + "\n")
-    
-    return boost
+        notes.append(("Email não fornecido",))
 
+    subject_boost = max(0.5, min(subject_boost, 1.5))
+
+    # --- Conteúdo do email ---
+    content_boost = 1.0
 
-def calculate_content_confidence_boost(email_text: str, word_count: int) -> float:
-    """
-    Calcula um multiplicador de confiança baseado no CONTEÚDO do email.
-    """
-    boost = 1.0
-    
-    print("\n" + "="*80)
-    print("[ANALISE DE CONTEÚDO DO EMAIL]")
-    print("="*80)
-    print(f"Tamanho do texto: {len(email_text)} caracteres")
-    print(f"Número de palavras: {word_count} palavras")
-    
     if word_count < 20:
-        print(f"  [RESULTADO] Texto MUITO CURTO ({word_count} palavras) - REDUZINDO 0.15")
-        boost -= 0.15
+        notes.append(("Texto MUITO CURTO (%d palavras) - REDUZINDO 0.15", word_count))
+        content_boost -= 0.15
     elif word_count > 500:
-        print(f"  [RESULTADO] Texto MUITO LONGO ({word_count} palavras) - REDUZINDO 0.05")
-        boost -= 0.05
+        notes.append(("Texto MUITO LONGO (%d palavras) - REDUZINDO 0.05", word_count))
+        content_boost -= 0.05
     else:
-        print(f"  [RESULTADO] Comprimento normal ({word_count} palavras) - AUMENTANDO 0.05")
-        boost += 0.05
-    
-    # Verificar CAPS LOCK excessivo
-    caps_count = sum(1 for c in email_text if c.isupper())
-    if word_count > 0:
-        caps_ratio = caps_count / len(email_text)
-        print(f"  Caracteres em MAIÚSCULA: {caps_count} ({caps_ratio:.1%})")
-        if caps_ratio > 0.3:
-            print(f"  [RESULTADO] Muitas MAIÚSCULAS ({caps_ratio:.1%}) - REDUZINDO 0.20 (SPAM!)")
-            boost -= 0.2
-    
+        notes.append(("Comprimento normal (%d palavras) - AUMENTANDO 0.05", word_count))
+        content_boost += 0.05
+
+    # Verificar CAPS LOCK excessivo (só A-Z ASCII: bytes de acentos em UTF-8 ficam acima de 0x7F)
+    text_bytes = np.frombuffer(email_text.encode("utf-8"), dtype=np.uint8)
+    caps_count = int(np.count_nonzero((text_bytes >= 0x41) & (text_bytes <= 0x5A)))
+    caps_ratio = caps_count / len(email_text) if word_count > 0 else 0.0
+    if caps_ratio > 0.3:
+        notes.append(("Muitas MAIÚSCULAS (%.1f%%) - REDUZINDO 0.20 (SPAM!)", caps_ratio * 100))
+        content_boost -= 0.2
+
     # Verificar pontuação
     question_count = email_text.count("?")
     exclamation_count = email_text.count("!")
-    
-    print(f"  Interrogações (?): {question_count}")
-    print(f"  Exclamações (!): {exclamation_count}")
-    
+
     if question_count > 2:
-        print(f"  [RESULTADO] Muitas interrogações - parece dúvida genuína - AUMENTANDO 0.10")
-        boost += 0.1
-    
+        notes.append(("Muitas interrogações - parece dúvida genuína - AUMENTANDO 0.10",))
+        content_boost += 0.1
+
     if exclamation_count > 5:
-        print(f"  [RESULTADO] Muitas exclamações - REDUZINDO 0.10 (suspeito)")
-        boost -= 0.1
-    
-    # Verificar palavras-chave profissionais
-    professional_keywords = {
-        "urgente", "suporte", "erro", "bug", "problema", "solicitação",
-        "informação", "status", "dúvida", "questão", "reunião", "aprovação",
-        "acesso", "integração", "implementação", "feedback", "relatório",
-        "correção", "alteração", "backup", "dados", "projeto", "prazo",
-        "ajuda", "assistência", "necessário", "importante", "atenção"
-    }
-    
-    email_lower = email_text.lower()
-    prof_keywords_found = [word for word in professional_keywords if word in email_lower]
+        notes.append(("Muitas exclamações - REDUZINDO 0.10 (suspeito)",))
+        content_boost -= 0.1
+
+    # Verificar palavras-chave profissionais (uma varredura com a regex pré-compilada)
+    prof_keywords_found = list(set(_KEYWORDS_RE.findall(email_text.lower())))
     prof_count = len(prof_keywords_found)
-    
-    print(f"  Palavras-chave profissionais encontradas: {prof_count}")
-    if prof_keywords_found:
-        print(f"    → {', '.join(prof_keywords_found[:5])}")
-    
+
     if prof_count >= 3:
-        print(f"  [RESULTADO] {prof_count} palavras profissionais - AUMENTANDO 0.15")
-        boost += 0.15
-    
-    boost = max(0.5, min(boost, 1.5))
-    
-    print(f"\n[MULTIPLICADOR CONTEÚDO] = {boost:.2f} (0.5-1.5)")
-    print("="*80 + "\n")
-    
-    return boost
+        notes.append(("%d palavras profissionais - AUMENTANDO 0.15", prof_count))
+        content_boost += 0.15
 
-# Gemini AI
-try:
-    from google import genai
-    _has_genai = True
-    logger.info("[OK] Biblioteca google-genai importada com sucesso")
-except Exception as e:
-    _has_genai = False
-    logger.error(f"[ERRO] Falha ao importar google-genai: {e}")
-
-_genai_api_key = os.getenv("GENAI_API_KEY")
+    content_boost = max(0.5, min(content_boost, 1.5))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        results = "\n".join(f"  [RESULTADO] {note[0] % note[1:]}" for note in notes)
+        logger.debug(
+            f"[ANALISE DO EMAIL]\n"
+            f"Assunto: '{user_subject}' | Nome: '{user_name}' | Email: '{user_email}'\n"
+            f"Tamanho do texto: {len(email_text)} caracteres, {word_count} palavras\n"
+            f"Caracteres em MAIÚSCULA: {caps_count} ({caps_ratio * 100:.1f}%) | "
+            f"Interrogações (?): {question_count} | Exclamações (!): {exclamation_count}\n"
+            f"Palavras-chave profissionais encontradas: {prof_count}"
+            f"{' → ' + ', '.join(prof_keywords_found[:5]) if prof_keywords_found else ''}\n"
+            f"{results}\n"
+            f"[MULTIPLICADOR ASSUNTO/EMAIL/NOME] = {subject_boost:.2f} (0.5-1.5)\n"
+            f"[MULTIPLICADOR CONTEÚDO] = {content_boost:.2f} (0.5-1.5)"
+        )
+
+    return EmailAnalysis(subject_boost, content_boost)
+
+# Gemini AI (biblioteca importada e cliente criado na primeira resposta gerada)
 genai_client = None
+_genai_initialized = False
+_genai_lock = threading.Lock()
 
-logger.info(f"[INFO] GENAI_API_KEY presente: {bool(_genai_api_key)}")
-if _genai_api_key:
-    logger.info(f"[INFO] GENAI_API_KEY tamanho: {len(_genai_api_key)} caracteres")
-    logger.info(f"[INFO] GENAI_API_KEY primeiros 10 chars: {_genai_api_key[:10]}***")
+# Tempo máximo de espera por uma resposta do Gemini (no streaming, pelo primeiro trecho)
+GENAI_TIMEOUT = 8.0
+# Tempo máximo para o streaming entregar a resposta inteira
+GENAI_STREAM_TIMEOUT = 30.0
+# Folga sobre esses limites nas esperas síncronas (inicialização do cliente e
+# agendamento no event loop)
+GENAI_TIMEOUT_MARGIN = 2.0
 
-if _has_genai and _genai_api_key:
-    try:
-        logger.info("[TENTANDO] Conectar ao Gemini AI...")
-        genai_client = genai.Client(api_key=_genai_api_key)
-        logger.info("[OK] Gemini AI cliente criado com sucesso")
-        print(f"[OK] genai_client: {genai_client}")
-    except Exception as e:
-        logger.error(f"[ERRO] Falha ao inicializar Gemini: {e}")
-        logger.error(f"[ERRO] Tipo de erro: {type(e).__name__}")
-        genai_client = None
-else:
-    if not _has_genai:
-        logger.warning("[AVISO] Biblioteca google-genai nao disponivel")
-    if not _genai_api_key:
-        logger.warning("[AVISO] GENAI_API_KEY nao configurada no .env")
+class _AsyncRunner:
+    """Event loop asyncio em uma thread própria, compartilhado por todas as requisições.
+
+    As chamadas ao Gemini (client.aio) ficam em voo simultaneamente nesse
+    único loop, sem ocupar uma thread por chamada.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, coro) -> Future:
+        """Agenda a corrotina no loop e retorna um concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def in_loop_thread(self) -> bool:
+        """Indica se o código atual roda na thread do loop (onde esperar um Future trava)."""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+                    thread.start()
+                    self._thread = thread
+                    self._loop = loop
+        return self._loop
+
+_genai_runner = _AsyncRunner("genai-loop")
+
+def _ensure_genai():
+    """Inicializa o cliente Gemini uma única vez por processo e o retorna (ou None)."""
+    global genai_client, _genai_initialized
+    if _genai_initialized:
+        return genai_client
+    with _genai_lock:
+        if _genai_initialized:
+            return genai_client
+        try:
+            from google import genai
+            logger.info("[OK] Biblioteca google-genai importada com sucesso")
+        except Exception as e:
+            genai = None
+            logger.error(f"[ERRO] Falha ao importar google-genai: {e}")
+
+        api_key = os.getenv("GENAI_API_KEY")
+        logger.info(f"[INFO] GENAI_API_KEY presente: {bool(api_key)}")
+        if api_key:
+            logger.info(f"[INFO] GENAI_API_KEY tamanho: {len(api_key)} caracteres")
+            logger.info(f"[INFO] GENAI_API_KEY primeiros 10 chars: {api_key[:10]}***")
+
+        if genai is not None and api_key:
+            try:
+                logger.info("[TENTANDO] Conectar ao Gemini AI...")
+                genai_client = genai.Client(api_key=api_key)
+                logger.info("[OK] Gemini AI cliente criado com sucesso")
+                logger.debug("[OK] genai_client: %s", genai_client)
+            except Exception as e:
+                logger.error(f"[ERRO] Falha ao inicializar Gemini: {e}")
+                logger.error(f"[ERRO] Tipo de erro: {type(e).__name__}")
+        else:
+            if genai is None:
+                logger.warning("[AVISO] Biblioteca google-genai nao disponivel")
+            if not api_key:
+                logger.warning("[AVISO] GENAI_API_KEY nao configurada no .env")
+        _genai_initialized = True
+        return genai_client
+
+# Prompt enviado ao Gemini (preenchido por _prepare_reply com str.format_map)
+_PROMPT_TEMPLATE = """Você é um assistente de suporte corporativo profissional e atencioso.
+
+Dados do email recebido:
+- Remetente: {name}
+- Email: {email}
+- Assunto: {subject}
+- Corpo: {body}
+
+Categoria detectada: {category}
+
+Gere uma resposta profissional, personalizada e concisa (máximo 6 linhas) que:
+1. Cumprimente o remetente pelo nome (se fornecido)
+2. Reconheça o assunto/conteúdo
+3. Forneça orientação apropriada
+4. Ofereça disponibilidade
+
+Não adicione explicações, apenas a resposta."""
+
+def _prepare_reply(email_text: str, category: str, user_name: str, user_email: str,
+                   user_subject: str, classification_score: float) -> Tuple[float, str]:
+    """Calcula o score ajustado pelos multiplicadores e monta o prompt do Gemini."""
+    logger.debug("[GERACAO DE RESPOSTA - INICIADA]")
+    logger.debug("Categoria: %s", category)
+    logger.debug("Score BRUTO recebido: %.2f", classification_score)
+    
+    # CALCULAR MULTIPLICADORES baseado em ASSUNTO e CONTEÚDO
+    # Multiplicadores do assunto/remetente e do conteúdo em uma só análise
+    word_count = len(email_text.split())
+    subject_boost, content_boost = _analyze_email(
+        user_subject, user_name, user_email, email_text, word_count
+    )
+    
+    # Combinar os multiplicadores (média ponderada)
+    logger.debug("Subject Boost: %.2f (pesa 40%%)", subject_boost)
+    logger.debug("Content Boost: %.2f (pesa 60%%)", content_boost)
+    
+    final_multiplier = (subject_boost * 0.4 + content_boost * 0.6)  # Conteúdo pesa mais
+    logger.debug("Multiplicador final: (%.2f × 0.4) + (%.2f × 0.6) = %.2f", subject_boost, content_boost, final_multiplier)
+    
+    # Aplicar o multiplicador ao score
+    logger.debug("PASSO 4: Aplicando multiplicador ao score...")
+    logger.debug("Cálculo: %.2f × %.2f = %.2f", classification_score, final_multiplier, classification_score * final_multiplier)
+    
+    adjusted_score = classification_score * final_multiplier
+    adjusted_score = max(0.0, min(adjusted_score, 1.0))  # Garantir 0-1
+    
+    logger.debug("Score AJUSTADO (final): %.2f", adjusted_score)
+    logger.debug("Mudança: %+.2f", adjusted_score - classification_score)
+    
+    logger.info(f"[GERANDO] Resposta para: {category}")
+    logger.info(f"[INFO] Score bruto: {classification_score:.2f}")
+    logger.info(f"[SCORE] Subject: {subject_boost:.2f} | Content: {content_boost:.2f} | Final: {final_multiplier:.2f} | Adjusted: {adjusted_score:.2f}")
+    
+    prompt = _PROMPT_TEMPLATE.format_map({
+        "name": user_name or "Não informado",
+        "email": user_email or "Não informado",
+        "subject": user_subject or "Sem assunto",
+        "body": email_text[:300],
+        "category": category,
+    })
+    return adjusted_score, prompt
 
 def generate_reply(email_text: str, category: str, user_name: str = "", 
-                   user_email: str = "", user_subject: str = "", classification_score: float = 0.5) -> str:
+                   user_email: str = "", user_subject: str = "", classification_score: float = 0.5) -> Dict:
     """Gera resposta automática personalizada com score adaptado ao conteúdo.
     
+    Retorna um dict com as chaves "category", "score" e "reply". A análise do
+    email roda na thread de quem chama; só a chamada ao Gemini vai para o event
+    loop compartilhado, aguardada por no máximo GENAI_TIMEOUT + GENAI_TIMEOUT_MARGIN
+    segundos (depois disso, resposta templada).
+    
     Args:
         email_text: Corpo do email original
         category: Categoria detectada (Produtivo/Improdutivo)
@@ -328,129 +712,252 @@ def generate_reply(email_text: str, category: str, user_name: str = "",
         classification_score: Score bruto da classificação
     """
     try:
-        print("\n\n" + "█"*80)
-        print("[GERACAO DE RESPOSTA - INICIADA]")
-        print("█"*80)
-        print(f"Categoria: {category}")
-        print(f"Score BRUTO recebido: {classification_score:.2f}")
-        
-        # CALCULAR MULTIPLICADORES baseado em ASSUNTO e CONTEÚDO
-        print("\n" + "-"*80)
-        print("PASSO 1: Calculando BOOST DO ASSUNTO...")
-        print("-"*80)
-        subject_boost = calculate_subject_confidence_boost(user_subject, user_name, user_email)
-        
-        print("\n" + "-"*80)
-        print("PASSO 2: Calculando BOOST DO CONTEÚDO...")
-        print("-"*80)
-        word_count = len(email_text.split())
-        content_boost = calculate_content_confidence_boost(email_text, word_count)
-        
-        # Combinar os multiplicadores (média ponderada)
-        print("\n" + "-"*80)
-        print("PASSO 3: Combinando os multiplicadores...")
-        print("-"*80)
-        print(f"Subject Boost: {subject_boost:.2f} (pesa 40%)")
-        print(f"Content Boost: {content_boost:.2f} (pesa 60%)")
-        
-        final_multiplier = (subject_boost * 0.4 + content_boost * 0.6)  # Conteúdo pesa mais
-        print(f"Multiplicador final: ({subject_boost:.2f} × 0.4) + ({content_boost:.2f} × 0.6) = {final_multiplier:.2f}")
-        
-        # Aplicar o multiplicador ao score
-        print("\n" + "-"*80)
-        print("PASSO 4: Aplicando multiplicador ao score...")
-        print("-"*80)
-        print(f"Cálculo: {classification_score:.2f} × {final_multiplier:.2f} = {classification_score * final_multiplier:.2f}")
-        
-        adjusted_score = classification_score * final_multiplier
-        adjusted_score = max(0.0, min(adjusted_score, 1.0))  # Garantir 0-1
-        
-        print(f"Score AJUSTADO (final): {adjusted_score:.2f}")
-        print(f"Mudança: {'+' if adjusted_score > classification_score else ''}{(adjusted_score - classification_score):.2f} ({((adjusted_score - classification_score)/classification_score * 100):+.1f}%)")
-        
-        logger.info(f"[GERANDO] Resposta para: {category}")
-        logger.info(f"[INFO] Score bruto: {classification_score:.2f}")
-        logger.info(f"[SCORE] Subject: {subject_boost:.2f} | Content: {content_boost:.2f} | Final: {final_multiplier:.2f} | Adjusted: {adjusted_score:.2f}")
-        
-        prompt = f"""Você é um assistente de suporte corporativo profissional e atencioso.
+        cache_key = _cache_key(category, user_name, user_email, user_subject,
+                               email_text, classification_score)
+        cached = _REPLY_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info("[CACHE] Resposta reaproveitada do cache")
+            return dict(cached)
 
-Dados do email recebido:
-- Remetente: {user_name if user_name else "Não informado"}
-- Email: {user_email if user_email else "Não informado"}
-- Assunto: {user_subject if user_subject else "Sem assunto"}
-- Corpo: {email_text[:300]}
+        score, prompt = _prepare_reply(email_text, category, user_name, user_email,
+                                       user_subject, classification_score)
+    except Exception as e:
+        return _reply_error(e)
 
-Categoria detectada: {category}
+    if _genai_runner.in_loop_thread():
+        # Esperar aqui travaria o próprio loop que executaria a chamada
+        logger.warning("[AVISO] generate_reply chamado dentro do event loop do Gemini, usando template")
+        return _template_result(category, score, user_name, user_subject, email_text)
 
-Gere uma resposta profissional, personalizada e concisa (máximo 6 linhas) que:
-1. Cumprimente o remetente pelo nome (se fornecido)
-2. Reconheça o assunto/conteúdo
-3. Forneça orientação apropriada
-4. Ofereça disponibilidade
+    future = _genai_runner.submit(_reply_from_prompt(
+        cache_key, prompt, email_text, category, user_name, user_subject,
+        classification_score, score
+    ))
+    try:
+        return future.result(timeout=GENAI_TIMEOUT + GENAI_TIMEOUT_MARGIN)
+    except FuturesTimeoutError:
+        future.cancel()
+        logger.error(f"[ERRO] Resposta nao ficou pronta em {GENAI_TIMEOUT + GENAI_TIMEOUT_MARGIN:g}s")
+        logger.warning("[FALLBACK] Usando template...")
+        return _template_result(category, score, user_name, user_subject, email_text)
+    except Exception as e:
+        return _reply_error(e)
 
-Não adicione explicações, apenas a resposta."""
-        
-        if genai_client:
-            try:
-                logger.info("[TENTANDO] Chamar Gemini API...")
-                response = genai_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt
-                )
-                reply_text = response.text.strip()
-                logger.info("[OK] Resposta recebida do Gemini")
-            except Exception as e:
-                logger.error(f"[ERRO] Falha ao chamar Gemini: {e}")
-                logger.error(f"[ERRO] Tipo: {type(e).__name__}")
-                logger.warning("[FALLBACK] Usando template...")
-                reply_text = _get_template_reply(category, user_name, user_subject, email_text)
-        else:
-            logger.warning("[AVISO] genai_client nao disponivel, usando template")
-            reply_text = _get_template_reply(category, user_name, user_subject, email_text)
-        
-        # USAR O SCORE AJUSTADO, NAO O SCORE BRUTO!
-        score = adjusted_score
-        
-        print("\n" + "█"*80)
-        print(f"[RESULTADO FINAL]")
-        print("█"*80)
-        print(f"Categoria: {category}")
-        print(f"Score Original: {classification_score:.2f}")
-        print(f"Score Ajustado: {score:.2f}")
-        print(f"Resposta: {reply_text[:80]}...")
-        print("█"*80 + "\n")
-        
-        logger.info(f"[OK] Resposta pronta com score ajustado: {score:.2f}")
-        return json.dumps({
-            "category": category,
-            "score": score,
-            "reply": reply_text
-        }, ensure_ascii=False)
+async def generate_reply_async(email_text: str, category: str, user_name: str = "", 
+                               user_email: str = "", user_subject: str = "",
+                               classification_score: float = 0.5) -> Dict:
+    """Versão assíncrona de generate_reply(): aguarda o Gemini sem bloquear o event loop.
     
+    A chamada ao Gemini roda no loop compartilhado de generate_reply(); o loop de
+    quem chama apenas aguarda o resultado.
+    """
+    try:
+        cache_key = _cache_key(category, user_name, user_email, user_subject,
+                               email_text, classification_score)
+        cached = _REPLY_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info("[CACHE] Resposta reaproveitada do cache")
+            return dict(cached)
+
+        score, prompt = _prepare_reply(email_text, category, user_name, user_email,
+                                       user_subject, classification_score)
+        # O cliente Gemini (e o pool de conexões dele) fica sempre no mesmo loop,
+        # o de _genai_runner, qualquer que seja o loop de quem chama
+        return await asyncio.wrap_future(_genai_runner.submit(_reply_from_prompt(
+            cache_key, prompt, email_text, category, user_name, user_subject,
+            classification_score, score
+        )))
+    except Exception as e:
+        return _reply_error(e)
+
+async def _reply_from_prompt(cache_key: str, prompt: str, email_text: str, category: str,
+                             user_name: str, user_subject: str, classification_score: float,
+                             score: float) -> Dict:
+    """Chama o Gemini com o prompt já montado (ou usa o template) e guarda o resultado no cache."""
+    cacheable = True
+    # A primeira inicialização importa a biblioteca: feita fora do event loop
+    client = genai_client if _genai_initialized else await asyncio.to_thread(_ensure_genai)
+    if client:
+        try:
+            logger.info("[TENTANDO] Chamar Gemini API...")
+            response = await asyncio.wait_for(client.aio.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=prompt
+            ), GENAI_TIMEOUT)
+            reply_text = response.text.strip()
+            logger.info("[OK] Resposta recebida do Gemini")
+        except asyncio.TimeoutError:
+            logger.error(f"[ERRO] Gemini nao respondeu em {GENAI_TIMEOUT:g}s")
+            logger.warning("[FALLBACK] Usando template...")
+            reply_text = _get_template_reply(category, user_name, user_subject, email_text)
+            cacheable = False
+        except Exception as e:
+            logger.error(f"[ERRO] Falha ao chamar Gemini: {e}")
+            logger.error(f"[ERRO] Tipo: {type(e).__name__}")
+            logger.warning("[FALLBACK] Usando template...")
+            reply_text = _get_template_reply(category, user_name, user_subject, email_text)
+            cacheable = False
+    else:
+        logger.warning("[AVISO] genai_client nao disponivel, usando template")
+        reply_text = _get_template_reply(category, user_name, user_subject, email_text)
+    
+    # USAR O SCORE AJUSTADO, NAO O SCORE BRUTO!
+    logger.debug("[RESULTADO FINAL]")
+    logger.debug("Categoria: %s", category)
+    logger.debug("Score Original: %.2f", classification_score)
+    logger.debug("Score Ajustado: %.2f", score)
+    logger.debug("Resposta: %.80s...", reply_text)
+    
+    logger.info(f"[OK] Resposta pronta com score ajustado: {score:.2f}")
+    result = {
+        "category": category,
+        "score": score,
+        "reply": reply_text
+    }
+    if cacheable:
+        _REPLY_CACHE.set(cache_key, dict(result))
+    return result
+
+def _template_result(category: str, score: float, user_name: str, user_subject: str,
+                     email_text: str) -> Dict:
+    """Resultado com a resposta templada (não vai para o cache, como as demais falhas do Gemini)."""
+    return {
+        "category": category,
+        "score": score,
+        "reply": _get_template_reply(category, user_name, user_subject, email_text)
+    }
+
+def _reply_error(e: Exception) -> Dict:
+    logger.error(f"[ERRO] Erro ao gerar resposta: {e}")
+    logger.error(f"[ERRO] Tipo: {type(e).__name__}")
+    return {
+        "category": "Erro",
+        "score": 0.0,
+        "reply": "Erro ao gerar resposta automatica."
+    }
+
+def generate_reply_stream(email_text: str, category: str, user_name: str = "", 
+                          user_email: str = "", user_subject: str = "",
+                          classification_score: float = 0.5) -> Iterator[str]:
+    """Gera a mesma resposta de generate_reply(), entregue em trechos à medida que o Gemini escreve.
+    
+    Sem Gemini (ou se ele falhar ou não entregar o primeiro trecho em
+    GENAI_TIMEOUT) a resposta templada sai em um único trecho. O streaming
+    inteiro é limitado a GENAI_STREAM_TIMEOUT. A resposta completa vai para o
+    cache de respostas.
+    """
+    try:
+        cache_key = _cache_key(category, user_name, user_email, user_subject,
+                               email_text, classification_score)
+        cached = _REPLY_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info("[CACHE] Resposta reaproveitada do cache")
+            yield cached["reply"]
+            return
+
+        score, prompt = _prepare_reply(email_text, category, user_name, user_email,
+                                       user_subject, classification_score)
     except Exception as e:
         logger.error(f"[ERRO] Erro ao gerar resposta: {e}")
-        logger.error(f"[ERRO] Tipo: {type(e).__name__}")
-        return json.dumps({
-            "category": "Erro",
-            "score": 0.0,
-            "reply": "Erro ao gerar resposta automatica."
-        }, ensure_ascii=False)
+        yield "Erro ao gerar resposta automatica."
+        return
+
+    parts = []
+    # Na thread do loop não há como esperar pelos trechos sem travá-lo
+    client = None if _genai_runner.in_loop_thread() else _ensure_genai()
+    if client:
+        stream = None
+        start = time.monotonic()
+        # Primeiro trecho em até GENAI_TIMEOUT; a resposta inteira em até GENAI_STREAM_TIMEOUT
+        first_deadline = start + GENAI_TIMEOUT
+        deadline = start + GENAI_STREAM_TIMEOUT
+        try:
+            logger.info("[TENTANDO] Chamar Gemini API (streaming)...")
+            stream = _run_until(client.aio.models.generate_content_stream(
+                model="gemini-2.5-flash",
+                contents=prompt
+            ), first_deadline)
+            while True:
+                chunk = _run_until(_next_chunk(stream), deadline if parts else first_deadline)
+                if chunk is None:
+                    break
+                if chunk.text:
+                    # Espaços no início da resposta são descartados, como no .strip() da versão completa
+                    text = chunk.text if parts else chunk.text.lstrip()
+                    if text:
+                        parts.append(text)
+                        yield text
+            logger.info("[OK] Resposta recebida do Gemini")
+        except (asyncio.TimeoutError, FuturesTimeoutError):
+            logger.error("[ERRO] Gemini nao concluiu o streaming no tempo limite")
+            if parts:
+                return
+            logger.warning("[FALLBACK] Usando template...")
+            yield _get_template_reply(category, user_name, user_subject, email_text)
+            return
+        except Exception as e:
+            logger.error(f"[ERRO] Falha ao chamar Gemini: {e}")
+            logger.error(f"[ERRO] Tipo: {type(e).__name__}")
+            if parts:
+                # Parte da resposta já foi enviada: não há como trocá-la pelo template
+                return
+            logger.warning("[FALLBACK] Usando template...")
+            yield _get_template_reply(category, user_name, user_subject, email_text)
+            return
+        finally:
+            # Encerra a conexão do stream também quando o cliente HTTP desconecta no meio
+            if stream is not None and hasattr(stream, "aclose"):
+                _genai_runner.submit(stream.aclose())
+    else:
+        logger.warning("[AVISO] genai_client nao disponivel, usando template")
+
+    if not parts:
+        parts.append(_get_template_reply(category, user_name, user_subject, email_text))
+        yield parts[0]
+
+    logger.info(f"[OK] Resposta pronta com score ajustado: {score:.2f}")
+    _REPLY_CACHE.set(cache_key, {
+        "category": category,
+        "score": score,
+        "reply": "".join(parts).rstrip()
+    })
+
+async def _next_chunk(stream):
+    """Próximo trecho do stream assíncrono, ou None no fim (anext() só existe a partir do 3.10)."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+def _run_until(awaitable, deadline: float):
+    """Executa awaitable no loop do Gemini e aguarda o resultado até deadline (time.monotonic())."""
+    remaining = max(deadline - time.monotonic(), 0.0)
+    future = _genai_runner.submit(asyncio.wait_for(awaitable, remaining))
+    try:
+        return future.result(timeout=remaining + GENAI_TIMEOUT_MARGIN)
+    except FuturesTimeoutError:
+        future.cancel()
+        raise
+
+def generate_reply_json(*args, **kwargs) -> str:
+    """Versão de generate_reply() que retorna a resposta serializada em JSON."""
+    result = generate_reply(*args, **kwargs)
+    if orjson is not None:
+        return orjson.dumps(result).decode("utf-8")
+    return json.dumps(result, ensure_ascii=False)
+
+# Descrição do tamanho da mensagem por faixa de palavras (<30, <80, <200, >=200)
+_LENGTH_LIMITS = (30, 80, 200)
+_LENGTH_DESCRIPTIONS = ("é bastante breve", "é concisa", "é detalhada", "é muito completa")
 
 def _get_template_reply(category: str, user_name: str = "", user_subject: str = "", 
                         email_text: str = "") -> str:
     """Retorna resposta templada personalizada baseada na categoria e dados do usuário."""
     greeting = f"Prezado(a) {user_name}" if user_name else "Prezado(a)"
     content_preview = email_text[:50] if email_text else "(sem conteúdo)"
-    word_count = len(email_text.split()) if email_text else 0
-    
-    if word_count < 30:
-        content_char = "é bastante breve"
-    elif word_count < 80:
-        content_char = "é concisa"
-    elif word_count < 200:
-        content_char = "é detalhada"
-    else:
-        content_char = "é muito completa"
+    # Estimativa sem alocar a lista de palavras (só escolhe o adjetivo abaixo)
+    word_count = email_text.count(" ") + 1 if email_text else 0
+    content_char = _LENGTH_DESCRIPTIONS[bisect.bisect_right(_LENGTH_LIMITS, word_count)]
     
     subject_text = f"'{user_subject}'" if user_subject else "(sem assunto)"
     
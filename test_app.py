@@ -1,15 +1,60 @@
 import unittest
 import json
+import os
 import sys
-from io import StringIO
-from unittest.mock import patch, MagicMock
-from main import app
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO, BytesIO
+import asyncio
+import atexit
+import shutil
+import tempfile
+from unittest.mock import patch, MagicMock, AsyncMock
+import nlp
+from sample_data import load_training_data
+from train_model import build_pipeline, fit_pipeline, save_model
+
+
+def _train_test_model():
+    """Treina o modelo em um diretório temporário antes de importar main.
+
+    main encerra o processo no import se não houver modelo: os testes não
+    dependem de um models/ gerado à parte. Processos auxiliares (TEST_WORKERS)
+    reaproveitam o mesmo arquivo via TEST_MODEL_PATH.
+    """
+    path = os.environ.get("TEST_MODEL_PATH")
+    if not path:
+        tmp_dir = tempfile.mkdtemp(prefix="email_model_")
+        atexit.register(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, "tfidf_lr.joblib")
+        texts, labels = load_training_data()
+        clean_texts = [nlp.preprocess_text(text)["clean_text"] for text in texts]
+        save_model(fit_pipeline(build_pipeline(), clean_texts, labels), path)
+        os.environ["TEST_MODEL_PATH"] = path
+    nlp.MODEL_PATH = path
+
+
+_train_test_model()
+
+from main import app, format_reply_html
 from nlp import (
     preprocess_text, 
     classify_text, 
+    classify_text_async,
+    classify_many,
     generate_reply,
-    _get_template_reply
+    generate_reply_async,
+    generate_reply_json,
+    generate_reply_stream,
+    _get_template_reply,
+    _analyze_email,
+    _Batcher
 )
+from utils import LRUCache, read_file_text, extract_pdf_text
+from pdfminer.layout import LTTextContainer
+from werkzeug.datastructures import FileStorage
 
 
 class TestPreprocessing(unittest.TestCase):
@@ -30,14 +75,24 @@ class TestPreprocessing(unittest.TestCase):
         
     def test_preprocess_removes_urls(self):
         """Testa que a função processa texto com URLs."""
-        result = preprocess_text("Visite http://example.com para mais info")
+        result = preprocess_text("Visite http://example.com/docs?id=1 para mais info")
         self.assertIn("clean_text", result)
         self.assertGreater(len(result["clean_text"]), 0)
+        self.assertNotIn("http", result["clean_text"])
+        self.assertNotIn("exampl", result["clean_text"])
         
     def test_preprocess_lowercase(self):
         """Testa conversão para minúsculas."""
         result = preprocess_text("TESTE COM MAIÚSCULAS")
         self.assertTrue(result["clean_text"].islower())
+        
+    def test_preprocess_strips_punctuation(self):
+        """Testa que pontuação não fica grudada nos tokens."""
+        result = preprocess_text("Erro: sistema (fora) do ar... urgente?!")
+        self.assertNotIn(":", result["clean_text"])
+        self.assertNotIn("?", result["clean_text"])
+        self.assertNotIn("(", result["clean_text"])
+        self.assertEqual(result["word_count"], 6)
 
 
 class TestClassification(unittest.TestCase):
@@ -61,6 +116,39 @@ class TestClassification(unittest.TestCase):
         self.assertGreaterEqual(score, 0.0)
         self.assertLessEqual(score, 1.0)
         
+    def test_quantized_predict_proba_matches_pipeline(self):
+        """Testa se a predição com pesos int8 acompanha a do pipeline original."""
+        pipeline = nlp.get_pipeline()
+        if nlp._quantized is None:
+            self.skipTest("Modelo treinado não disponível")
+        texts = [preprocess_text(t)["clean_text"] for t in (
+            "Preciso de suporte urgente, o sistema está fora do ar",
+            "Muito obrigado pela ajuda e boas festas!"
+        )]
+        expected = pipeline.predict_proba(texts)
+        result = nlp._predict_proba(texts)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue((abs(result - expected) < 0.01).all())
+        
+    def test_classify_many_matches_classify_text(self):
+        """Testa classificação em lote com uma única chamada ao modelo."""
+        texts = [preprocess_text(t)["clean_text"] for t in (
+            "Solicito acesso ao sistema de relatórios financeiros do trimestre",
+            "Parabéns pela promoção, desejo muito sucesso na nova função",
+            "Olá pessoal"
+        )]
+        nlp._CLASSIFY_CACHE.clear()
+        with patch("nlp._predict_proba", side_effect=nlp._predict_proba) as predict:
+            results = classify_many(texts)
+        self.assertEqual(predict.call_count, 1)
+        self.assertEqual(results, [classify_text(t) for t in texts])
+        self.assertEqual(results[2], ("Improdutivo", 0.1))
+        
+    def test_classify_text_async_matches_sync(self):
+        """Testa se a classificação assíncrona retorna o mesmo resultado da síncrona."""
+        clean_text = preprocess_text("Preciso do status da aprovação do projeto")["clean_text"]
+        self.assertEqual(asyncio.run(classify_text_async(clean_text)), classify_text(clean_text))
+        
     def test_classify_returns_valid_score(self):
         """Testa se score é válido."""
         text = "Teste geral de classificação"
@@ -124,73 +212,285 @@ class TestTemplateReply(unittest.TestCase):
 class TestGenerateReply(unittest.TestCase):
     """Testes para geração de respostas com Gemini fallback."""
     
-    def test_generate_reply_returns_json(self):
-        """Testa se generate_reply retorna JSON válido."""
-        result_json = generate_reply(
+    def test_generate_reply_returns_dict(self):
+        """Testa se generate_reply retorna dict com os campos esperados."""
+        result = generate_reply(
             email_text="Teste de email",
             category="Produtivo",
             user_name="Teste User",
             user_email="teste@email.com",
             user_subject="Teste"
         )
-        result = json.loads(result_json)
         self.assertIn("category", result)
         self.assertIn("score", result)
         self.assertIn("reply", result)
         
+    def test_generate_reply_json_returns_json(self):
+        """Testa se generate_reply_json retorna JSON válido."""
+        result_json = generate_reply_json(
+            email_text="Teste de email",
+            category="Produtivo",
+            user_name="Teste User",
+            user_email="teste@email.com",
+            user_subject="Teste"
+        )
+        result = json.loads(result_json)
+        self.assertEqual(result["category"], "Produtivo")
+        self.assertIn("reply", result)
+        
     def test_generate_reply_includes_category(self):
         """Testa se resposta inclui categoria correta."""
-        result_json = generate_reply(
+        result = generate_reply(
             email_text="Teste",
             category="Produtivo",
             user_name="Teste",
             user_email="teste@email.com",
             user_subject="Assunto"
         )
-        result = json.loads(result_json)
         self.assertEqual(result["category"], "Produtivo")
         
     def test_generate_reply_has_valid_score(self):
         """Testa se score é válido."""
-        result_json = generate_reply(
+        result = generate_reply(
             email_text="Teste",
             category="Improdutivo",
             user_name="Teste",
             user_email="teste@email.com",
             user_subject="Assunto"
         )
-        result = json.loads(result_json)
         score = result["score"]
         self.assertGreaterEqual(score, 0.0)
         self.assertLessEqual(score, 1.0)
         
     def test_generate_reply_has_text(self):
         """Testa se resposta contém texto."""
-        result_json = generate_reply(
+        result = generate_reply(
             email_text="Teste",
             category="Produtivo",
             user_name="Teste",
             user_email="teste@email.com",
             user_subject="Assunto"
         )
-        result = json.loads(result_json)
         self.assertGreater(len(result["reply"]), 0)
+        
+    def test_generate_reply_gemini_timeout_uses_template(self):
+        """Testa fallback para template quando o Gemini excede o tempo limite."""
+        async def slow_generate_content(**kwargs):
+            await asyncio.sleep(0.5)
+        client = MagicMock()
+        client.aio.models.generate_content = AsyncMock(side_effect=slow_generate_content)
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True), \
+                patch("nlp.GENAI_TIMEOUT", 0.05):
+            result = generate_reply(
+                email_text="Teste de timeout do Gemini",
+                category="Produtivo",
+                user_name="Teste Timeout",
+                user_email="timeout@email.com",
+                user_subject="Timeout"
+            )
+        self.assertIn("Teste Timeout", result["reply"])
+        self.assertIn("Prezado(a)", result["reply"])
+
+    def test_generate_reply_stalled_loop_uses_template(self):
+        """Testa que a espera síncrona tem limite mesmo se o event loop não concluir a chamada."""
+        async def stalled(*args):
+            await asyncio.sleep(1)
+        with patch("nlp._reply_from_prompt", side_effect=stalled), \
+                patch("nlp.GENAI_TIMEOUT", 0.05), patch("nlp.GENAI_TIMEOUT_MARGIN", 0.05):
+            result = generate_reply(
+                email_text="Teste de loop travado",
+                category="Produtivo",
+                user_name="Teste Travado",
+                user_email="travado@email.com",
+                user_subject="Travado"
+            )
+        self.assertEqual(result["category"], "Produtivo")
+        self.assertIn("Teste Travado", result["reply"])
+
+    def test_generate_reply_analyzes_in_caller_thread(self):
+        """Testa que a análise do email roda na thread de quem chama, não no event loop."""
+        threads = []
+        def record_thread(*args):
+            threads.append(threading.current_thread())
+            return nlp.EmailAnalysis(1.0, 1.0)
+        with patch("nlp._analyze_email", side_effect=record_thread):
+            generate_reply(
+                email_text="Teste da thread da análise",
+                category="Produtivo",
+                user_name="Teste Thread",
+                user_email="thread@email.com",
+                user_subject="Thread"
+            )
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_generate_reply_uses_gemini_response(self):
+        """Testa uso do texto retornado pelo Gemini quando disponível."""
+        client = MagicMock()
+        client.aio.models.generate_content = AsyncMock(
+            return_value=MagicMock(text="  Resposta do Gemini.  ")
+        )
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            result = generate_reply(
+                email_text="Teste de resposta do Gemini",
+                category="Produtivo",
+                user_name="Teste Gemini",
+                user_email="gemini@email.com",
+                user_subject="Gemini"
+            )
+        self.assertEqual(result["reply"], "Resposta do Gemini.")
+        
+    def test_generate_reply_prompt_includes_email_data(self):
+        """Testa se o prompt enviado ao Gemini contém os dados do email (inclusive chaves literais)."""
+        client = MagicMock()
+        client.aio.models.generate_content = AsyncMock(return_value=MagicMock(text="Ok."))
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            generate_reply(
+                email_text="Corpo com {chaves} literais",
+                category="Improdutivo",
+                user_email="prompt@email.com",
+                user_subject="Teste de prompt"
+            )
+        prompt = client.aio.models.generate_content.call_args.kwargs["contents"]
+        self.assertIn("- Remetente: Não informado", prompt)
+        self.assertIn("- Assunto: Teste de prompt", prompt)
+        self.assertIn("- Corpo: Corpo com {chaves} literais", prompt)
+        self.assertIn("Categoria detectada: Improdutivo", prompt)
+        
+    def test_generate_reply_stream_yields_gemini_chunks(self):
+        """Testa entrega da resposta do Gemini em trechos."""
+        async def chunks_stream():
+            for text in ("  Olá, ", None, "tudo certo."):
+                yield MagicMock(text=text)
+        client = MagicMock()
+        client.aio.models.generate_content_stream = AsyncMock(return_value=chunks_stream())
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            chunks = list(generate_reply_stream(
+                email_text="Teste de streaming do Gemini",
+                category="Produtivo",
+                user_name="Teste Stream",
+                user_email="stream@email.com",
+                user_subject="Stream"
+            ))
+        self.assertEqual(chunks, ["Olá, ", "tudo certo."])
+        
+    def test_generate_reply_stream_falls_back_to_template(self):
+        """Testa template em um único trecho quando o Gemini falha antes de responder."""
+        client = MagicMock()
+        client.aio.models.generate_content_stream = AsyncMock(side_effect=RuntimeError("falha"))
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            chunks = list(generate_reply_stream(
+                email_text="Teste de falha no streaming",
+                category="Produtivo",
+                user_name="Teste Falha",
+                user_email="falha@email.com",
+                user_subject="Falha"
+            ))
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("Teste Falha", chunks[0])
+        
+    def test_generate_reply_stream_first_chunk_timeout_uses_template(self):
+        """Testa template quando o primeiro trecho do Gemini não chega no tempo limite."""
+        async def stalled_stream():
+            await asyncio.sleep(1)
+            yield MagicMock(text="tarde demais")
+        client = MagicMock()
+        client.aio.models.generate_content_stream = AsyncMock(return_value=stalled_stream())
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True), \
+                patch("nlp.GENAI_TIMEOUT", 0.05):
+            chunks = list(generate_reply_stream(
+                email_text="Teste de streaming travado",
+                category="Produtivo",
+                user_name="Teste Lento",
+                user_email="lento@email.com",
+                user_subject="Lento"
+            ))
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("Teste Lento", chunks[0])
+        
+    def test_generate_reply_async_uses_gemini_response(self):
+        """Testa a versão assíncrona aguardando o cliente client.aio do Gemini."""
+        client = MagicMock()
+        client.aio.models.generate_content = AsyncMock(
+            return_value=MagicMock(text="Resposta assíncrona.")
+        )
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            result = asyncio.run(generate_reply_async(
+                email_text="Teste da versão assíncrona",
+                category="Produtivo",
+                user_name="Teste Async",
+                user_email="async@email.com",
+                user_subject="Async"
+            ))
+        self.assertEqual(result["reply"], "Resposta assíncrona.")
+        self.assertEqual(result["category"], "Produtivo")
+
+    def test_generate_reply_async_calls_gemini_on_shared_loop(self):
+        """Testa que a versão assíncrona usa o mesmo event loop do cliente Gemini que a síncrona."""
+        threads = []
+        async def record_thread(**kwargs):
+            threads.append(threading.current_thread().name)
+            return MagicMock(text="Ok.")
+        client = MagicMock()
+        client.aio.models.generate_content = AsyncMock(side_effect=record_thread)
+        with patch("nlp.genai_client", client), patch("nlp._genai_initialized", True):
+            asyncio.run(generate_reply_async(
+                email_text="Teste do loop compartilhado",
+                category="Produtivo",
+                user_name="Teste Loop",
+                user_email="loop@email.com",
+                user_subject="Loop"
+            ))
+        self.assertEqual(threads, ["genai-loop"])
+
+        
+    def test_analyze_email_returns_both_boosts(self):
+        """Testa se a análise única do email retorna os dois multiplicadores."""
+        text = "Preciso de ajuda urgente com o erro no relatório do projeto"
+        analysis = _analyze_email(
+            "Erro urgente", "Teste Silva", "teste@empresa.com", text, len(text.split())
+        )
+        # Assunto profissional (+0.15), nome (+0.10) e email corporativo (+0.20)
+        self.assertAlmostEqual(analysis.subject_boost, 1.45)
+        # Texto curto (-0.15) com 3+ palavras profissionais (+0.15)
+        self.assertAlmostEqual(analysis.content_boost, 1.0)
+        
+    def test_analyze_email_counts_overlapping_keywords(self):
+        """Testa que palavras-chave sobrepostas no texto contam separadamente (como substring)."""
+        self.assertEqual(
+            set(nlp._KEYWORDS_RE.findall("problemacesso e feedbackup")),
+            {"problema", "acesso", "feedback", "backup"}
+        )
+
+    def test_analyze_email_subject_ignores_case_and_accents(self):
+        """Testa detecção de assunto profissional sem depender de maiúsculas ou acentos."""
+        for subject in ("SOLICITAÇÃO de férias", "Solicitacao de ferias", "Problemas no login"):
+            analysis = _analyze_email(subject, "", "", "texto", 1)
+            self.assertAlmostEqual(analysis.subject_boost, 1.15, msg=subject)
+        
+    def test_analyze_email_penalizes_caps_lock(self):
+        """Testa redução do multiplicador de conteúdo para texto em MAIÚSCULAS."""
+        text = "COMPRE AGORA A PROMOÇÃO IMPERDÍVEL DE HOJE"
+        normal = _analyze_email("", "", "", text.lower(), len(text.split()))
+        shouting = _analyze_email("", "", "", text, len(text.split()))
+        self.assertAlmostEqual(normal.content_boost - shouting.content_boost, 0.2)
 
 
 class TestFlaskRoutes(unittest.TestCase):
     """Testes para rotas Flask."""
     
-    def setUp(self):
-        """Configura cliente de teste."""
-        self.app = app
-        self.client = self.app.test_client()
-        self.app.config['TESTING'] = True
+    @classmethod
+    def setUpClass(cls):
+        """Configura o app e um cliente de teste compartilhado pela classe."""
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.client = cls.app.test_client()
         
     def test_index_get(self):
         """Testa rota GET /."""
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
-        self.assertIn(b"email", response.data.lower() or b"form", response.data.lower())
+        data_lower = response.data.lower()
+        self.assertTrue(b"email" in data_lower or b"form" in data_lower)
         
     def test_process_empty_text(self):
         """Testa POST /process com texto vazio."""
@@ -211,7 +511,7 @@ class TestFlaskRoutes(unittest.TestCase):
             "text": "Preciso de suporte urgente com erro no sistema"
         })
         self.assertEqual(response.status_code, 200)
-        self.assertIn(b"Jo", response.data or b"o Silva", response.data)
+        self.assertIn("João Silva".encode("utf-8"), response.data)
         
     def test_process_with_all_fields(self):
         """Testa POST /process com todos os campos."""
@@ -222,6 +522,108 @@ class TestFlaskRoutes(unittest.TestCase):
             "text": "Tenho uma dúvida sobre o produto. Como posso fazer?"
         })
         self.assertEqual(response.status_code, 200)
+        
+    def test_process_rejects_large_upload(self):
+        """Testa rejeição de uploads acima de MAX_CONTENT_LENGTH."""
+        response = self.client.post("/process", data={
+            "text": "",
+            "file": (BytesIO(b"a" * (2 * 1024 * 1024)), "grande.txt")
+        }, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("muito grande", response.data.decode("utf-8"))
+
+    def test_process_stream_rejects_large_upload_as_plain_text(self):
+        """Testa rejeição de uploads grandes em /process/stream com corpo em texto puro."""
+        response = self.client.post("/process/stream", data={
+            "text": "",
+            "file": (BytesIO(b"a" * (2 * 1024 * 1024)), "grande.txt")
+        }, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.mimetype, "text/plain")
+        self.assertIn("muito grande", response.get_data(as_text=True))
+
+    def test_process_stream_returns_reply_text(self):
+        """Testa rota POST /process/stream com resposta em texto puro."""
+        with patch("nlp.genai_client", None), patch("nlp._genai_initialized", True):
+            response = self.client.post("/process/stream", data={
+                "text": "Preciso de ajuda com o erro no sistema de faturamento",
+                "nome": "Teste Stream"
+            })
+            body = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.headers["X-Category"], ["Produtivo", "Improdutivo"])
+        self.assertIn("Teste Stream", body)
+        
+    def test_process_stream_empty_text(self):
+        """Testa rota POST /process/stream sem texto."""
+        response = self.client.post("/process/stream", data={"text": ""})
+        self.assertEqual(response.status_code, 400)
+
+    def test_process_stream_classification_error_is_plain_text(self):
+        """Testa que falhas na classificação voltam como texto puro, não como página HTML."""
+        with patch("main.classify_text", side_effect=RuntimeError("falha no modelo")):
+            response = self.client.post("/process/stream", data={"text": "Teste de erro no streaming"})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.mimetype, "text/plain")
+        self.assertIn("falha no modelo", response.get_data(as_text=True))
+
+
+class TestUtils(unittest.TestCase):
+    """Testes para leitura de arquivos enviados e formatação da resposta em HTML."""
+    
+    def test_read_file_text_reads_pdf_in_memory(self):
+        """Testa extração de texto de PDF enviado, sem arquivo temporário."""
+        pdf = (
+            b"%PDF-1.4\n"
+            b"1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+            b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 300 144]/Contents 4 0 R"
+            b"/Resources<</Font<</F1 5 0 R>>>>>>endobj\n"
+            b"4 0 obj<</Length 44>>stream\n"
+            b"BT /F1 18 Tf 20 100 Td (Suporte urgente) Tj ET\n"
+            b"endstream endobj\n"
+            b"5 0 obj<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>endobj\n"
+            b"trailer<</Root 1 0 R>>\n%%EOF"
+        )
+        uploaded = FileStorage(stream=BytesIO(pdf), filename="email.pdf")
+        with patch("tempfile.NamedTemporaryFile") as tmp:
+            text = read_file_text(uploaded)
+        tmp.assert_not_called()
+        self.assertEqual(text.strip(), "Suporte urgente")
+        
+        # Reenvio do mesmo arquivo: texto vem do cache, sem novo parse
+        with patch("utils.extract_pages") as extract:
+            again = read_file_text(FileStorage(stream=BytesIO(pdf), filename="copia.pdf"))
+        extract.assert_not_called()
+        self.assertEqual(again, text)
+        
+    def test_extract_pdf_text_stops_at_char_budget(self):
+        """Testa que a extração de PDF para ao atingir o limite de caracteres."""
+        def page(text):
+            element = MagicMock(spec=LTTextContainer)
+            element.get_text.return_value = text
+            return [element]
+        def pages():
+            yield page("a" * 6)
+            yield page("b" * 6)
+            raise AssertionError("página além do limite foi interpretada")
+        with patch("utils.extract_pages", return_value=pages()):
+            text = extract_pdf_text(b"%PDF", max_chars=10)
+        self.assertEqual(text, "a" * 6 + "b" * 4)
+        
+    def test_read_file_text_limits_txt_bytes(self):
+        """Testa leitura limitada de arquivos .txt."""
+        uploaded = FileStorage(stream=BytesIO("ação ".encode("utf-8") * 100), filename="email.txt")
+        text = read_file_text(uploaded, max_bytes=13)
+        self.assertEqual(text, "ação ação")
+        
+    def test_format_reply_html(self):
+        """Testa conversão de quebras de linha da resposta para HTML."""
+        reply = "Olá,\r\n\r\nTudo certo.\nAtenciosamente\n\n\nEquipe"
+        self.assertEqual(
+            format_reply_html(reply),
+            "Olá,<p>Tudo certo.<br>Atenciosamente<p><br>Equipe"
+        )
 
 
 class TestIntegration(unittest.TestCase):
@@ -236,14 +638,13 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(category, "Produtivo")
         self.assertGreaterEqual(score, 0.5)
         
-        reply_json = generate_reply(
+        result = generate_reply(
             email_text=email_text,
             category=category,
             user_name="Cliente VIP",
             user_email="vip@empresa.com",
             user_subject="Erro Crítico"
         )
-        result = json.loads(reply_json)
         
         self.assertEqual(result["category"], "Produtivo")
         self.assertIn("Cliente VIP", result["reply"])
@@ -257,14 +658,13 @@ class TestIntegration(unittest.TestCase):
         
         self.assertEqual(category, "Improdutivo")
         
-        reply_json = generate_reply(
+        result = generate_reply(
             email_text=email_text,
             category=category,
             user_name="Cliente Satisfeito",
             user_email="satisfeito@empresa.com",
             user_subject="Agradecimento"
         )
-        result = json.loads(reply_json)
         
         self.assertEqual(result["category"], "Improdutivo")
         self.assertIn("Cliente Satisfeito", result["reply"])
@@ -301,37 +701,181 @@ class TestEdgeCases(unittest.TestCase):
         self.assertGreater(len(processed["clean_text"]), 0)
 
 
-def run_tests_with_report():
-    """Executa testes com relatório detalhado."""
+class TestLRUCache(unittest.TestCase):
+    """Testes para o cache LRU de predições e respostas."""
+    
+    def test_cache_evicts_least_recently_used(self):
+        """Testa descarte da entrada menos usada ao exceder o limite."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+        
+    def test_cache_expires_entries(self):
+        """Testa expiração de entradas mais antigas que o TTL."""
+        cache = LRUCache(maxsize=2, ttl=60)
+        with patch("utils.time.monotonic", return_value=1000.0):
+            cache.set("a", 1)
+        with patch("utils.time.monotonic", return_value=1030.0):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("utils.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+            
+    def test_classify_text_uses_cache(self):
+        """Testa se classificações repetidas retornam o resultado em cache."""
+        clean_text = preprocess_text("Preciso de suporte urgente com erro no sistema")["clean_text"]
+        first = classify_text(clean_text)
+        with patch("nlp._classify_uncached") as uncached:
+            second = classify_text(clean_text)
+        uncached.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_classify_text_does_not_cache_fallback(self):
+        """Testa que a heurística usada quando o modelo falha não fica no cache."""
+        clean_text = preprocess_text("Solicito suporte para o erro de acesso ao relatório")["clean_text"]
+        nlp._CLASSIFY_CACHE.clear()
+        with patch("nlp._classify_batcher.submit", side_effect=TimeoutError):
+            classify_text(clean_text)
+        with patch("nlp._classify_batcher.submit", wraps=nlp._classify_batcher.submit) as submit:
+            result = classify_text(clean_text)
+        submit.assert_called_once_with(clean_text)
+        self.assertEqual(result, classify_text(clean_text))
+
+    def test_classify_many_does_not_cache_fallback(self):
+        """Testa que classify_many não guarda a heurística quando a predição em lote falha."""
+        clean_text = preprocess_text("Preciso do relatório de erros do sistema hoje")["clean_text"]
+        nlp._CLASSIFY_CACHE.clear()
+        with patch("nlp._predict_proba", side_effect=RuntimeError("falha")), \
+                patch("nlp._classify_batcher.submit", side_effect=TimeoutError):
+            classify_many([clean_text])
+        self.assertIsNone(nlp._CLASSIFY_CACHE.get(nlp._cache_key(clean_text)))
+        classify_many([clean_text])
+        self.assertIsNotNone(nlp._CLASSIFY_CACHE.get(nlp._cache_key(clean_text)))
+
+    def test_preprocess_text_uses_cache(self):
+        """Testa se textos repetidos reaproveitam o pré-processamento em cache."""
+        text = "Solicito o relatório atualizado do projeto de integração"
+        first = preprocess_text(text)
+        with self.assertRaises(TypeError):
+            first["clean_text"] = "alterado"
+        with patch("nlp._preprocess_uncached") as uncached:
+            second = preprocess_text(text)
+        uncached.assert_not_called()
+        self.assertIs(second, first)
+
+
+class TestBatcher(unittest.TestCase):
+    """Testes para o agrupamento de predições em lote."""
+    
+    def test_batcher_groups_concurrent_items(self):
+        """Testa se itens enviados juntos são processados em um só lote."""
+        batch_sizes = []
+        started, release = threading.Event(), threading.Event()
+        def predict(items):
+            batch_sizes.append(len(items))
+            if items == ["primeiro"]:
+                # Segura o primeiro lote enquanto os demais itens chegam
+                started.set()
+                release.wait(timeout=5)
+            return [item.upper() for item in items]
+        batcher = _Batcher(predict, max_batch_size=16, max_latency_ms=50)
+        first = batcher.submit("primeiro")
+        self.assertTrue(started.wait(timeout=5))
+        futures = [batcher.submit(text) for text in ("a", "b", "c")]
+        release.set()
+        self.assertEqual(first.result(timeout=5), "PRIMEIRO")
+        self.assertEqual([f.result(timeout=5) for f in futures], ["A", "B", "C"])
+        self.assertEqual(batch_sizes, [1, 3])
+        
+    def test_batcher_single_item_skips_latency_window(self):
+        """Testa que um item sozinho é processado sem esperar max_latency_ms."""
+        batcher = _Batcher(lambda items: items, max_latency_ms=2000)
+        start = time.monotonic()
+        self.assertEqual(batcher.submit("texto").result(timeout=5), "texto")
+        self.assertLess(time.monotonic() - start, 1.0)
+        
+    def test_batcher_propagates_errors(self):
+        """Testa se erros da predição chegam a quem enviou o item."""
+        def predict(items):
+            raise ValueError("falha no modelo")
+        batcher = _Batcher(predict, max_latency_ms=1)
+        with self.assertRaises(ValueError):
+            batcher.submit("texto").result(timeout=5)
+
+
+# Classes executadas por run_tests_with_report (cada uma é independente das demais)
+TEST_CASES = (
+    TestPreprocessing,
+    TestClassification,
+    TestTemplateReply,
+    TestGenerateReply,
+    TestFlaskRoutes,
+    TestUtils,
+    TestIntegration,
+    TestEdgeCases,
+    TestLRUCache,
+    TestBatcher,
+)
+
+
+def _run_test_case(name):
+    """Executa uma classe de TEST_CASES em um processo auxiliar e devolve saída e contagens."""
+    stream = StringIO()
+    case = globals()[name]
+    suite = unittest.TestLoader().loadTestsFromTestCase(case)
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    return stream.getvalue(), result.testsRun, len(result.failures), len(result.errors)
+
+
+def run_tests_with_report(workers=None):
+    """Executa testes com relatório detalhado.
+    
+    Com workers > 1 (ou TEST_WORKERS no ambiente) cada classe de teste roda em
+    um processo próprio, em paralelo; 0 usa todos os núcleos.
+    """
+    if workers is None:
+        workers = int(os.environ.get("TEST_WORKERS", "1"))
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    
     print("\n" + "="*70)
     print("🧪 INICIANDO TESTES DA APLICAÇÃO DE CLASSIFICAÇÃO DE EMAILS")
     print("="*70 + "\n")
     
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    # Adicionar todos os testes
-    suite.addTests(loader.loadTestsFromTestCase(TestPreprocessing))
-    suite.addTests(loader.loadTestsFromTestCase(TestClassification))
-    suite.addTests(loader.loadTestsFromTestCase(TestTemplateReply))
-    suite.addTests(loader.loadTestsFromTestCase(TestGenerateReply))
-    suite.addTests(loader.loadTestsFromTestCase(TestFlaskRoutes))
-    suite.addTests(loader.loadTestsFromTestCase(TestIntegration))
-    suite.addTests(loader.loadTestsFromTestCase(TestEdgeCases))
-    
-    runner = unittest.TextTestRunner(verbosity=2)
-    result = runner.run(suite)
+    if workers > 1:
+        tests_run = failures = errors = 0
+        # spawn: processos novos, sem herdar threads nem locks do processo atual
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as executor:
+            for output, run, failed, errored in executor.map(
+                _run_test_case, [case.__name__ for case in TEST_CASES]
+            ):
+                sys.stderr.write(output)
+                tests_run += run
+                failures += failed
+                errors += errored
+    else:
+        loader = unittest.TestLoader()
+        suite = unittest.TestSuite([loader.loadTestsFromTestCase(case) for case in TEST_CASES])
+        
+        runner = unittest.TextTestRunner(verbosity=2)
+        result = runner.run(suite)
+        tests_run, failures, errors = result.testsRun, len(result.failures), len(result.errors)
     
     print("\n" + "="*70)
     print("📊 RESUMO DOS TESTES")
     print("="*70)
-    print(f"✅ Testes executados: {result.testsRun}")
-    print(f"✅ Sucessos: {result.testsRun - len(result.failures) - len(result.errors)}")
-    print(f"❌ Falhas: {len(result.failures)}")
-    print(f"⚠️  Erros: {len(result.errors)}")
+    print(f"✅ Testes executados: {tests_run}")
+    print(f"✅ Sucessos: {tests_run - failures - errors}")
+    print(f"❌ Falhas: {failures}")
+    print(f"⚠️  Erros: {errors}")
     print("="*70 + "\n")
     
-    return result.wasSuccessful()
+    return failures == 0 and errors == 0
 
 
 if __name__ == "__main__":
@@ -10,6 +10,9 @@ import json
 
 BASE_URL = "http://127.0.0.1:5000"
 
+# Uma única sessão: os quatro testes reaproveitam a mesma conexão keep-alive
+SESSION = requests.Session()
+
 # Teste 1: Email Profissional Completo
 print("\n" + "="*100)
 print("[TESTE 1] EMAIL PROFISSIONAL COMPLETO")
@@ -35,7 +38,7 @@ test1 = {
     "subject": "URGENTE: Erro crítico na integração - Suporte"
 }
 
-response = requests.post(f"{BASE_URL}/process", json=test1)
+response = SESSION.post(f"{BASE_URL}/process", json=test1)
 print(f"\nStatus: {response.status_code}")
 result = response.json()
 print(f"Categoria: {result['category']}")
@@ -61,7 +64,7 @@ test2 = {
     "subject": "CLIQUE AQUI!!! GANHE DINHEIRO!!!"
 }
 
-response = requests.post(f"{BASE_URL}/process", json=test2)
+response = SESSION.post(f"{BASE_URL}/process", json=test2)
 print(f"\nStatus: {response.status_code}")
 result = response.json()
 print(f"Categoria: {result['category']}")
@@ -80,7 +83,7 @@ test3 = {
     "subject": "oi"
 }
 
-response = requests.post(f"{BASE_URL}/process", json=test3)
+response = SESSION.post(f"{BASE_URL}/process", json=test3)
 print(f"\nStatus: {response.status_code}")
 result = response.json()
 print(f"Categoria: {result['category']}")
@@ -107,7 +110,7 @@ test4 = {
     "subject": "Dúvidas sobre sistema de relatório"
 }
 
-response = requests.post(f"{BASE_URL}/process", json=test4)
+response = SESSION.post(f"{BASE_URL}/process", json=test4)
 print(f"\nStatus: {response.status_code}")
 result = response.json()
 print(f"Categoria: {result['category']}")
@@ -115,5 +118,5 @@ print(f"Score: {result['score']:.2f}")
 print(f"Resposta: {result['reply']}\n")
 
 print("\n" + "="*100)
-print("[TESTES COMPLETOS] Verifique o console do servidor para ver todos os PRINTS detalhados!")
+print("[TESTES COMPLETOS] Verifique o console do servidor (iniciado com LOG_LEVEL=DEBUG) para ver a analise detalhada!")
 print("="*100 + "\n")
@@ -1,16 +1,36 @@
 """
 Script de treinamento do modelo de classificação de emails.
-Treina um modelo TF-IDF + Logistic Regression e salva em models/tfidf_lr.joblib
+Treina um modelo TF-IDF (features por hashing) + Logistic Regression e salva em
+models/tfidf_lr.joblib
+
+Uso: python -m train_model  (o servidor não treina o modelo sozinho)
 """
 
 import os
+import re
 import joblib
+import sklearn
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from sklearn.linear_model import LogisticRegression
 from nltk.stem import RSLPStemmer
 from nltk.corpus import stopwords
-from sample_data import TEXTS, LABELS
+from sample_data import load_training_data
+from nlp import preprocess_text
+
+MODEL_PATH = "models/tfidf_lr.joblib"
+# Um diretório por versão de sklearn/joblib: um pipeline salvo por outra versão
+# nunca é reaproveitado como modelo de produção depois de uma atualização
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache",
+    f"sklearn-{sklearn.__version__}_joblib-{joblib.__version__}"
+)
+
+# Cache em disco do treino: reexecuções com os mesmos dados não reajustam o modelo
+memory = joblib.Memory(CACHE_DIR, verbose=0)
+
+# Tokenizador compilado uma única vez (vai junto no pickle do pipeline)
+_TOKEN_RE = re.compile(r'(?u)\b\w+\b')
 
 try:
     stop_words = set(stopwords.words("portuguese"))
@@ -20,50 +40,93 @@ except:
         "no","na","por","se","que","ao","à","este","esse","aquele"
     ])
 
-os.makedirs("models", exist_ok=True)
-
-print("[INICIO] Iniciando treinamento do modelo...")
-print(f"[INFO] Total de amostras: {len(TEXTS)}")
-print(f"[OK] Produtivos: {sum(LABELS)}")
-print(f"[INFO] Improdutivos: {len(LABELS) - sum(LABELS)}")
-
-pipeline = Pipeline([
-    ('tfidf', TfidfVectorizer(
-        max_features=500,
-        stop_words=list(stop_words),
-        ngram_range=(1, 2),
-        min_df=1,
-        max_df=0.8,
-        lowercase=True,
-        token_pattern=r'(?u)\b\w+\b'
-    )),
-    ('classifier', LogisticRegression(
-        max_iter=200,
-        random_state=42,
-        solver='lbfgs'
-    ))
-])
-
-print("\n[TRAIN] Treinando modelo...")
-pipeline.fit(TEXTS, LABELS)
-
-model_path = "models/tfidf_lr.joblib"
-joblib.dump(pipeline, model_path)
-print(f"[OK] Modelo salvo em: {model_path}")
-
-print("\n[TEST] Testando modelo:")
-test_emails = [
-    "Preciso de suporte urgente. Sistema fora do ar.",
-    "Obrigado pela ajuda!",
-    "Qual é o status do projeto?",
-    "Parabéns pelo ótimo trabalho!"
-]
-
-for email in test_emails:
-    pred = pipeline.predict([email])[0]
-    proba = pipeline.predict_proba([email])[0]
-    category = "Produtivo" if pred == 1 else "Improdutivo"
-    confidence = max(proba) * 100
-    print(f"  [EMAIL] '{email[:40]}...' -> {category} ({confidence:.1f}%)")
-
-print("\n[FIM] Treinamento concluido!")
\ No newline at end of file
+
+def build_pipeline():
+    """Monta o pipeline TF-IDF + Logistic Regression (ainda não treinado).
+
+    O HashingVectorizer não guarda vocabulário: na inferência cada token vira
+    hash + módulo, sem busca em dicionário.
+    """
+    return Pipeline([
+        ('hashing', HashingVectorizer(
+            n_features=2**18,
+            alternate_sign=False,
+            norm=None,
+            stop_words=sorted(stop_words),
+            ngram_range=(1, 2),
+            lowercase=True,
+            tokenizer=_TOKEN_RE.findall,
+            token_pattern=None
+        )),
+        ('tfidf', TfidfTransformer()),
+        # liblinear: coordenadas no primal, converge rápido com poucas amostras e muitas features
+        ('classifier', LogisticRegression(
+            solver='liblinear',
+            C=1.0,
+            max_iter=100,
+            random_state=42
+        ))
+    ])
+
+
+@memory.cache
+def fit_pipeline(pipeline, clean_texts, labels):
+    """Ajusta o pipeline e guarda o resultado em CACHE_DIR entre execuções.
+
+    O joblib.Memory usa como chave o hash do pipeline ainda não treinado (todos
+    os parâmetros), dos textos e dos rótulos: qualquer mudança refaz o ajuste.
+    """
+    # HashingVectorizer não tem estado: só TF-IDF e classificador são ajustados
+    X = pipeline.named_steps["hashing"].transform(clean_texts)
+    pipeline[1:].fit(X, labels)
+    return pipeline
+
+
+def save_model(pipeline, path=MODEL_PATH):
+    """Salva o pipeline de forma atômica: leitores nunca veem um arquivo pela metade.
+
+    Sem compressão: o servidor carrega com mmap_mode="r", que só mapeia os
+    arrays do disco quando o arquivo não está comprimido.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(pipeline, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+
+def main():
+    print("[INICIO] Iniciando treinamento do modelo...")
+    texts, labels = load_training_data()
+    print(f"[INFO] Total de amostras: {len(texts)}")
+    print(f"[OK] Produtivos: {sum(labels)}")
+    print(f"[INFO] Improdutivos: {len(labels) - sum(labels)}")
+
+    print("\n[TRAIN] Treinando modelo...")
+    # Mesmo pré-processamento (stopwords + stemming) aplicado no servidor antes de classificar
+    clean_texts = [preprocess_text(text)["clean_text"] for text in texts]
+    pipeline = fit_pipeline(build_pipeline(), clean_texts, labels)
+
+    save_model(pipeline)
+    print(f"[OK] Modelo salvo em: {MODEL_PATH}")
+
+    print("\n[TEST] Testando modelo:")
+    test_emails = [
+        "Preciso de suporte urgente. Sistema fora do ar.",
+        "Obrigado pela ajuda!",
+        "Qual é o status do projeto?",
+        "Parabéns pelo ótimo trabalho!"
+    ]
+
+    # Uma única chamada ao pipeline para todos os exemplos
+    probas = pipeline.predict_proba([preprocess_text(email)["clean_text"] for email in test_emails])
+    for email, proba in zip(test_emails, probas):
+        pred = pipeline.classes_[proba.argmax()]
+        category = "Produtivo" if pred == 1 else "Improdutivo"
+        confidence = max(proba) * 100
+        print(f"  [EMAIL] '{email[:40]}...' -> {category} ({confidence:.1f}%)")
+
+    print("\n[FIM] Treinamento concluido!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,94 @@
-import os
-import tempfile
-from pdfminer.high_level import extract_text
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
 
-def read_file_text(uploaded_file):
-    """Lê o conteúdo de um arquivo .txt ou .pdf e retorna o texto."""
+
+class LRUCache:
+    """Cache LRU em memória, seguro entre threads, com expiração opcional (ttl em segundos)."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Retorna o valor associado a key ou default se ausente/expirado."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            timestamp, value = item
+            if self.ttl is not None and time.monotonic() - timestamp > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Armazena value, descartando a entrada menos usada se o cache estiver cheio."""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Texto extraído de PDFs recentes (o pdfminer é a etapa mais cara de um upload)
+_PDF_TEXT_CACHE = LRUCache(maxsize=128)
+# Caracteres lidos de um PDF (o início do email basta para classificar e responder)
+PDF_MAX_CHARS = 20_000
+
+
+def read_file_text(uploaded_file, max_bytes=None):
+    """Lê o conteúdo de um arquivo .txt ou .pdf e retorna o texto.
+
+    Arquivos .txt são lidos direto do stream do upload, no máximo max_bytes
+    bytes. PDFs precisam ser lidos por inteiro para serem interpretados, e o
+    pdfminer os lê da memória (sem arquivo temporário em disco).
+    """
     filename = uploaded_file.filename.lower()
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
-        uploaded_file.save(tmp.name)
-        temp_path = tmp.name
-
-    try:
-        if filename.endswith(".txt"):
-            with open(temp_path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-        elif filename.endswith(".pdf"):
-            text = extract_text(temp_path)
-        else:
-            text = ""
-    finally:
-        os.remove(temp_path) 
+    if filename.endswith(".txt"):
+        data = uploaded_file.stream.read(-1 if max_bytes is None else max_bytes)
+        return data.decode("utf-8", errors="ignore")
+    if not filename.endswith(".pdf"):
+        return ""
 
+    # Reenvios do mesmo PDF reaproveitam o texto já extraído (chave = sha256 dos bytes)
+    data = uploaded_file.stream.read()
+    key = hashlib.sha256(data).digest()
+    text = _PDF_TEXT_CACHE.get(key)
+    if text is None:
+        text = extract_pdf_text(data)
+        _PDF_TEXT_CACHE.set(key, text)
     return text
+
+
+def extract_pdf_text(data, max_chars=PDF_MAX_CHARS):
+    """Extrai o texto de um PDF página a página, parando ao atingir max_chars caracteres.
+
+    As páginas seguintes nem chegam a ser interpretadas pelo pdfminer.
+    """
+    parts = []
+    total = 0
+    for page in extract_pages(io.BytesIO(data)):
+        for element in page:
+            if isinstance(element, LTTextContainer):
+                part = element.get_text()
+                parts.append(part)
+                total += len(part)
+                if total >= max_chars:
+                    return "".join(parts)[:max_chars]
+    return "".join(parts)